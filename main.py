@@ -1,12 +1,38 @@
-import pyautogui
+import cv2
+import numpy as np
 import time
+import math
 import threading
 import pickle
+import struct
 import os
+import sys
+import ctypes
+import ctypes.util
+import queue
+import multiprocessing
+import weakref
+from multiprocessing import shared_memory
+import json
+import argparse
+import sqlite3
 import tkinter as tk
 from tkinter import ttk, messagebox
-from pynput import keyboard
 from datetime import datetime
+from contextlib import contextmanager
+from collections import deque, namedtuple
+
+# both need a display to import, the replay tools still have to run without one
+try:
+    import pyautogui
+except Exception:
+    pyautogui = None
+try:
+    from pynput import keyboard, mouse
+except Exception:
+    keyboard = mouse = None
+
+Point = namedtuple('Point', 'x y')
 
 DEFAULT_CONFIG = {
     'golden_toggle_key': 'f8',
@@ -14,6 +40,25 @@ DEFAULT_CONFIG = {
     'golden_check_interval_ms': 500,
     'golden_confidence': 0.80,
     'golden_image_path': '.cookieclickercc/golden_cookie.png',
+    'golden_grayscale': True,  # same as pyscreeze's default, colour matching is several times slower
+    'golden_scan_region': None,  # (left, top, width, height), None = whole screen
+    'golden_scan_region_auto': True,
+    'golden_scan_region_store_width': 300,  # store panel on the game's right edge (px at 100% zoom), left out of the learned region
+    'golden_match_mode': 'full',  # 'full' or 'pyramid'
+    'golden_pyramid_levels': 2,  # each level halves the resolution, 2 = 1/4 scale
+    'golden_pyramid_candidates': 3,  # coarse matches confirmed at full resolution, caps pyramid matches per scan (storms want >= golden_max_matches)
+    'golden_diff_gate': True,  # only match parts of the screen that changed since the last scan
+    'golden_diff_tile_size': 64,
+    'golden_diff_threshold': 8,  # mean grey level change for a tile to count as changed
+    'golden_diff_full_scan_every': 20,
+    'golden_color_prefilter': True,  # only match around golden coloured blobs
+    'golden_color_full_scan_every': 10,
+    'golden_max_matches': 10,  # most golden cookies clicked from a single scan
+    'golden_storm_detections': 5,  # this many golden cookies within the window turns storm mode on
+    'golden_storm_window_sec': 3,
+    'golden_storm_idle_sec': 2,  # storm mode turns off after this long without a golden cookie
+    'golden_storm_interval_ms': 20,
+    'golden_max_frame_age_ms': 1000,  # matches from a frame older than this by click time are thrown away, 0 = never
     'golden_cookies_clicked_total': 0,
     
     'big_toggle_key': 'f9',
@@ -21,10 +66,1667 @@ DEFAULT_CONFIG = {
     'big_check_interval_ms': 1,
     'big_confidence': 0.80,
     'big_image_path': '.cookieclickercc/big_cookie.png',
-    'big_cookies_clicked_total': 0
+    'big_grayscale': True,
+    'big_state_scales': (1.0, 1.06, 0.96),  # normal, hovered (grows) and pressed (shrinks) big cookie
+    'big_state_image_paths': [],  # extra images of other big cookie states, e.g. a screenshot of it hovered
+    'big_click_threads': 1,  # click worker threads, one is normally plenty
+    'big_click_spin_us': 200,  # last part of each click interval is busy-waited instead of slept, for accurate pacing
+    'big_move_tolerance': 10,  # moving the mouse further than this (px) from the big cookie stops the clicker
+    'big_cookies_clicked_total': 0,
+    
+    'capture_backend': 'auto',  # 'auto', 'xshm' or 'pyautogui'
+    'capture_slots': 1,  # frames kept for detectors, newest always wins
+    'input_backend': 'auto',  # 'auto', 'xtest', 'pyautogui' or 'null' (no real clicks)
+    'detection_worker': True,  # run golden cookie detection in a separate process
+    'template_scale': 1.0,  # template size relative to the images on disk, follows the browser zoom
+    'big_cookie_position': None,  # last place the big cookie was found
+    'big_cookie_fingerprint': None,  # screen/zoom layout the position was found under
+    'history_enabled': True,  # per second click counts and every golden cookie click go to HISTORY_FILE
+    'persist_debounce_sec': 5,  # settings and counters are written at most this often, and always on exit
 }
 root_dir = '.cookieclickercc'
 CONFIG_FILE = '.cookieclickercc/cccc-data.pkl'
+STATS_JOURNAL_FILE = '.cookieclickercc/cccc-stats.journal'
+HISTORY_FILE = '.cookieclickercc/cccc-history.sqlite'
+COUNTER_KEYS = ('golden_cookies_clicked_total', 'big_cookies_clicked_total')  # live in the stats journal, not the settings file
+TEMPLATE_SCALES = (0.5, 0.67, 0.75, 0.8, 0.9, 1.0, 1.1, 1.25, 1.5, 1.75, 2.0)  # browser zoom levels relative to the templates
+
+class TemplateCache:
+    # decoded template images kept in memory, reloaded only if the file changes on disk
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, path, grayscale=False, scale=1.0):
+        mtime = os.path.getmtime(path)
+        key = (path, grayscale, scale)
+
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry[0] == mtime:
+            return entry[1]
+
+        image = cv2.imread(path, cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR)
+        if image is None:
+            raise FileNotFoundError(f"Could not load template image: {path}")
+        if scale != 1.0:
+            image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR)
+
+        with self._lock:
+            # drop stale variants of this file so old decodes don't pile up
+            for stale_key in [k for k, v in self._entries.items() if k[0] == path and v[0] != mtime]:
+                del self._entries[stale_key]
+            self._entries[key] = (mtime, image)
+        return image
+
+    def variants(self, path, scales, grayscale=False):
+        # template bank, one scaled copy of the template per zoom level
+        return [(scale, self.get(path, grayscale=grayscale, scale=scale)) for scale in scales]
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+def estimate_game_region(cookie_position, screen_size, store_width=300, column_fraction=0.3):
+    # golden cookies spawn anywhere in the game except over the store on its right edge. The game is taken to reach the
+    # right edge of the screen, and the big cookie sits in the middle of the left column (column_fraction of the game
+    # wide), which puts the game's left edge where cookie_x - left = column_fraction / 2 * (screen_width - left).
+    # Everything grows with the window, so this scales with the screen instead of the cookie
+    cookie_x = int(cookie_position[0])
+    screen_width, screen_height = int(screen_size[0]), int(screen_size[1])
+    half_column = column_fraction / 2
+    
+    left = int(min(max(0, (cookie_x - half_column * screen_width) / (1 - half_column)), cookie_x))
+    right = screen_width - int(store_width)
+    if right <= left or screen_height <= 0:
+        return None
+    return (left, 0, right - left, screen_height)
+
+def region_fits_screen(region, screen_size):
+    left, top, width, height = region
+    return left >= 0 and top >= 0 and width > 0 and height > 0 and \
+        left + width <= screen_size[0] and top + height <= screen_size[1]
+
+class Frame:
+    # one captured BGR image shared by every detector, grayscale and downscaled views are computed once on first use
+    def __init__(self, image, offset=(0, 0), sequence=0, captured_at=None, full_screen=False, parent=None, parent_slice=None):
+        self.image = image
+        self.offset = (int(offset[0]), int(offset[1]))  # screen position of the top left pixel
+        self.sequence = sequence
+        self.captured_at = time.perf_counter() if captured_at is None else captured_at
+        self.full_screen = full_screen
+        self.consumed = 0  # how many subscribers picked this frame up
+        self.shared_name = None  # shared memory segment image lives in (from the start of it), if any
+        
+        self._parent = parent
+        self._parent_slice = parent_slice
+        self._gray = None
+        self._scaled = {}
+        self._lock = threading.Lock()
+    
+    @property
+    def shape(self):
+        return self.image.shape
+    
+    def gray(self):
+        with self._lock:
+            if self._gray is None:
+                if self._parent is not None:
+                    # crops reuse the parent's conversion instead of converting their own pixels again
+                    top, bottom, left, right = self._parent_slice
+                    self._gray = self._parent.gray()[top:bottom, left:right]
+                elif self.image.ndim == 2:
+                    self._gray = self.image
+                else:
+                    self._gray = cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY)
+            return self._gray
+    
+    def scaled_gray(self, scale):
+        with self._lock:
+            scaled = self._scaled.get(scale)
+        if scaled is None:
+            scaled = cv2.resize(self.gray(), None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            with self._lock:
+                self._scaled[scale] = scaled
+        return scaled
+    
+    def crop(self, left, top, width, height):
+        # window in frame coordinates, shares this frame's views
+        return Frame(self.image[top:top + height, left:left + width], (self.offset[0] + left, self.offset[1] + top),
+                     self.sequence, self.captured_at, parent=self, parent_slice=(top, top + height, left, left + width))
+    
+    def shared_location(self):
+        # (segment name, byte offset, strides) of this frame's pixels, so another process can map them without a copy
+        root = self
+        while root._parent is not None:
+            root = root._parent
+        if root.shared_name is None:
+            return None
+        offset = self.image.__array_interface__['data'][0] - root.image.__array_interface__['data'][0]
+        return root.shared_name, offset, self.image.strides
+    
+    def covers(self, region):
+        # region in screen coordinates, None = whole screen
+        if self.full_screen:
+            return True
+        if region is None:
+            return False
+        height, width = self.image.shape[:2]
+        return self.offset[0] <= region[0] and self.offset[1] <= region[1] and \
+            region[0] + region[2] <= self.offset[0] + width and region[1] + region[3] <= self.offset[1] + height
+    
+    def region(self, region):
+        # window in screen coordinates, None = the whole frame
+        if region is None:
+            return self
+        left, top = region[0] - self.offset[0], region[1] - self.offset[1]
+        return self.crop(max(0, left), max(0, top), region[2], region[3])
+
+def estimate_template_scale(frame, template_variants, confidence):
+    # one pass over every scaled template, returns (scale, screen position) of the best match or (None, None)
+    gray = frame.gray()
+    best_score, best_scale, best_position = confidence, None, None
+    for scale, template in template_variants:
+        peaks = find_template_peaks(gray, template, best_score, 1)
+        if peaks:
+            score, x, y = peaks[0]
+            template_height, template_width = template.shape[:2]
+            best_score, best_scale = score, scale
+            best_position = Point(frame.offset[0] + x + template_width // 2, frame.offset[1] + y + template_height // 2)
+    return best_scale, best_position
+
+def locate_best_center(templates, frame, confidence):
+    # tries every template (visual state) against the same frame and returns the screen centre of the best match
+    best = None
+    for template in templates:
+        peaks = find_template_peaks(frame.gray() if template.ndim == 2 else frame.image, template, confidence, 1)
+        if peaks and (best is None or peaks[0][0] > best[0]):
+            score, x, y = peaks[0]
+            template_height, template_width = template.shape[:2]
+            best = (score, x + template_width // 2, y + template_height // 2)
+    if best is None:
+        return None
+    return Point(int(frame.offset[0] + best[1]), int(frame.offset[1] + best[2]))
+
+def find_template_peaks(image, template, threshold, limit):
+    # up to `limit` best match positions (top left corner) scoring at least threshold, overlapping peaks suppressed
+    if image.shape[0] < template.shape[0] or image.shape[1] < template.shape[1]:
+        return []
+    result = cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED)
+    height, width = template.shape[:2]
+    
+    peaks = []
+    for _ in range(limit):
+        _, score, _, (x, y) = cv2.minMaxLoc(result)
+        if score < threshold:
+            break
+        peaks.append((score, x, y))
+        result[max(0, y - height // 2):y + height // 2 + 1, max(0, x - width // 2):x + width // 2 + 1] = -1
+    return peaks
+
+def box_overlap(a, b):
+    # intersection over union of two (score, left, top, width, height) matches
+    overlap_width = min(a[1] + a[3], b[1] + b[3]) - max(a[1], b[1])
+    overlap_height = min(a[2] + a[4], b[2] + b[4]) - max(a[2], b[2])
+    if overlap_width <= 0 or overlap_height <= 0:
+        return 0.0
+    intersection = overlap_width * overlap_height
+    return intersection / (a[3] * a[4] + b[3] * b[4] - intersection)
+
+def non_max_suppression(matches, overlap_threshold=0.3):
+    # keeps only the best scoring match out of every group of overlapping ones
+    kept = []
+    for match in sorted(matches, key=lambda m: m[0], reverse=True):
+        if all(box_overlap(match, other) <= overlap_threshold for other in kept):
+            kept.append(match)
+    return kept
+
+def find_all_matches(frame, template, confidence, limit=10):
+    # every match above confidence from a single correlation map, as (score, left, top, width, height) within the frame
+    image = frame.gray() if template.ndim == 2 else frame.image
+    if image.shape[0] < template.shape[0] or image.shape[1] < template.shape[1]:
+        return []
+    result = cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED)
+    ys, xs = np.nonzero(result >= confidence)
+    scores = result[ys, xs]
+    
+    # a real cookie lights up a whole cluster of neighbouring positions, no need to feed all of them through nms
+    if len(scores) > limit * 100:
+        best = np.argpartition(scores, -limit * 100)[-limit * 100:]
+        ys, xs, scores = ys[best], xs[best], scores[best]
+    
+    template_height, template_width = template.shape[:2]
+    matches = [(float(score), int(x), int(y), template_width, template_height) for score, x, y in zip(scores, xs, ys)]
+    return non_max_suppression(matches)[:limit]
+
+def pyramid_find_matches(frame, template, small_template, confidence, scale, candidates):
+    # coarse grayscale match at `scale`, then confirm only the best few candidates at full resolution
+    gray = frame.gray()
+    small_frame = frame.scaled_gray(scale)
+    
+    # downscaling blurs the score so the coarse pass is deliberately looser than the real threshold
+    peaks = find_template_peaks(small_frame, small_template, confidence - 0.15, candidates)
+    
+    template_height, template_width = template.shape[:2]
+    pad = int(round(2 / scale))
+    matches = []
+    for _, x, y in peaks:
+        left = max(0, int(x / scale) - pad)
+        top = max(0, int(y / scale) - pad)
+        crop = (gray if template.ndim == 2 else frame.image)[top:top + template_height + 2 * pad, left:left + template_width + 2 * pad]
+        
+        confirmed = find_template_peaks(crop, template, confidence, 1)
+        if confirmed:
+            score, match_x, match_y = confirmed[0]
+            matches.append((score, left + match_x, top + match_y, template_width, template_height))
+    return non_max_suppression(matches)
+
+class TileChangeGate:
+    # compares each frame tile by tile against the previous scan, only windows around changed tiles need matching
+    skip_stat = 'skipped_unchanged'
+    
+    def __init__(self, tile_size=64, threshold=8, full_scan_every=20, hold_scans=3):
+        self.tile_size = tile_size
+        self.threshold = threshold
+        self.full_scan_every = full_scan_every
+        self.hold_scans = hold_scans  # changed tiles stay active for a few scans so fading in cookies get rechecked
+        
+        self._previous = None
+        self._active = None
+        self._scans_since_full = 0
+        self._full_scan = False
+    
+    def reset(self):
+        # forget the previous scan, the next one is a full scan
+        self._previous = None
+        self._active = None
+        self._scans_since_full = 0
+    
+    def begin_scan(self):
+        # once per scan, before any windows() call
+        self._scans_since_full += 1
+        self._full_scan = self._scans_since_full >= self.full_scan_every
+        if self._full_scan:
+            self._scans_since_full = 0
+    
+    def windows(self, frame, template_size):
+        # returns (left, top, width, height) windows to match in, [] if nothing relevant changed
+        height, width = frame.shape[:2]
+        tiles_x = max(1, -(-width // self.tile_size))
+        tiles_y = max(1, -(-height // self.tile_size))
+        
+        # 8x8 samples per tile is plenty to spot a cookie appearing and keeps the diff tiny
+        small = cv2.resize(frame.gray(), (tiles_x * 8, tiles_y * 8), interpolation=cv2.INTER_AREA)
+        previous, self._previous = self._previous, small
+        
+        if previous is None or previous.shape != small.shape or self._full_scan:
+            self._scans_since_full = 0
+            self._active = np.zeros((tiles_y, tiles_x), dtype=np.int32)
+            return [(0, 0, width, height)]
+        
+        tile_diff = cv2.resize(cv2.absdiff(small, previous), (tiles_x, tiles_y), interpolation=cv2.INTER_AREA)
+        self._active = np.where(tile_diff >= self.threshold, self.hold_scans, np.maximum(self._active - 1, 0))
+        mask = (self._active > 0).astype(np.uint8)
+        if not mask.any():
+            return []
+        
+        # group neighbouring tiles and pad by the template size so cookies on tile borders still fit
+        template_height, template_width = template_size[:2]
+        tile_width = width / tiles_x
+        tile_height = height / tiles_y
+        _, _, boxes, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        windows = []
+        for tile_left, tile_top, tile_count_x, tile_count_y, _ in boxes[1:]:
+            left = max(0, int(tile_left * tile_width) - template_width)
+            top = max(0, int(tile_top * tile_height) - template_height)
+            right = min(width, int((tile_left + tile_count_x) * tile_width) + template_width)
+            bottom = min(height, int((tile_top + tile_count_y) * tile_height) + template_height)
+            windows.append((left, top, right - left, bottom - top))
+        return windows
+
+class ColorCandidateFilter:
+    # proposes windows around blobs of golden cookie coloured pixels, with a full match every so often in case it misses one
+    skip_stat = 'skipped_no_color'
+    
+    def __init__(self, full_scan_every=10, lower_hsv=(18, 90, 160), upper_hsv=(32, 200, 255)):
+        self.full_scan_every = full_scan_every
+        self.lower_hsv = np.array(lower_hsv, dtype=np.uint8)
+        self.upper_hsv = np.array(upper_hsv, dtype=np.uint8)
+        self._scans = 0
+        self._full_scan = False
+    
+    def reset(self):
+        pass  # nothing is kept from one frame to the next
+    
+    def begin_scan(self):
+        # counted per scan, windows() can be called several times per scan (once per window the stage before kept)
+        self._scans += 1
+        self._full_scan = bool(self.full_scan_every) and self._scans % self.full_scan_every == 0
+    
+    def windows(self, frame, template_size):
+        height, width = frame.shape[:2]
+        template_height, template_width = template_size[:2]
+        
+        if self._full_scan:
+            return [(0, 0, width, height)]
+        if frame.image.ndim != 3:
+            return [(0, 0, width, height)]  # no colour to go on
+        
+        # half resolution is plenty for blobs the size of a cookie
+        small = cv2.resize(frame.image, (max(1, width // 2), max(1, height // 2)), interpolation=cv2.INTER_NEAREST)
+        mask = cv2.inRange(cv2.cvtColor(small, cv2.COLOR_BGR2HSV), self.lower_hsv, self.upper_hsv)
+        mask = cv2.dilate(mask, np.ones((5, 5), dtype=np.uint8))
+        _, _, blobs, centroids = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        
+        min_size = min(template_width, template_height) * 0.4 / 2
+        max_size = max(template_width, template_height) * 1.6 / 2
+        windows = []
+        for (_, _, blob_width, blob_height, _), (center_x, center_y) in zip(blobs[1:], centroids[1:]):
+            if not (min_size <= max(blob_width, blob_height) <= max_size):
+                continue
+            left = max(0, int(center_x * 2) - template_width)
+            top = max(0, int(center_y * 2) - template_height)
+            right = min(width, int(center_x * 2) + template_width)
+            bottom = min(height, int(center_y * 2) + template_height)
+            windows.append((left, top, right - left, bottom - top))
+        return windows
+
+def propose_windows(stages, frame, template_size, stats=None):
+    # runs the frame through each prefilter stage, every stage only looks inside the windows the previous one kept
+    height, width = frame.shape[:2]
+    windows = [(0, 0, width, height)]
+    for stage in stages:
+        stage.begin_scan()  # every stage counts the scan, even if an earlier one ends it
+    for stage in stages:
+        refined = []
+        for left, top, window_width, window_height in windows:
+            crop = frame.crop(left, top, window_width, window_height)
+            for x, y, refined_width, refined_height in stage.windows(crop, template_size):
+                refined.append((left + x, top + y, refined_width, refined_height))
+        windows = refined
+        if not windows:
+            if stats is not None:
+                stats[stage.skip_stat] = stats.get(stage.skip_stat, 0) + 1
+            break
+    return windows
+
+class StormTracker:
+    # turns storm mode on when lots of golden cookies show up in a short time and off once they stop coming
+    def __init__(self, detections=5, window_sec=3, idle_sec=2):
+        self.detections = detections
+        self.window_sec = window_sec
+        self.idle_sec = idle_sec
+        
+        self.active = False
+        self._recent = deque()
+        self._last_detection = 0
+        self.started_at = 0
+        self.storm_clicks = 0
+        self.storm_scans = 0
+    
+    def update(self, count, now=None):
+        # call once per scan with the number of cookies clicked, returns 'started', 'ended' or None
+        now = time.time() if now is None else now
+        if count:
+            self._last_detection = now
+            self._recent.extend([now] * count)
+        while self._recent and now - self._recent[0] > self.window_sec:
+            self._recent.popleft()
+        
+        if not self.active:
+            if len(self._recent) >= self.detections:
+                self.active = True
+                self.started_at = self._recent[0]
+                self.storm_clicks = len(self._recent)
+                self.storm_scans = 1
+                return 'started'
+            return None
+        
+        self.storm_scans += 1
+        self.storm_clicks += count
+        if now - self._last_detection > self.idle_sec:
+            self.active = False
+            self._recent.clear()
+            return 'ended'
+        return None
+    
+    def summary(self):
+        duration = max(self._last_detection - self.started_at, 0.001)
+        return {
+            'duration_sec': duration,
+            'clicks': self.storm_clicks,
+            'scans': self.storm_scans,
+            'clicks_per_sec': self.storm_clicks / duration,
+            'clicks_per_scan': self.storm_clicks / max(self.storm_scans, 1),
+        }
+
+def order_click_path(start, points):
+    # greedy nearest neighbour route through the points, good enough for a handful of cookies
+    remaining = list(points)
+    path = []
+    current = start
+    while remaining:
+        nearest = min(remaining, key=lambda p: (p[0] - current[0]) ** 2 + (p[1] - current[1]) ** 2)
+        remaining.remove(nearest)
+        path.append(nearest)
+        current = nearest
+    return path
+
+class GoldenDetector:
+    # the whole golden cookie detection stack (prefilters + matcher) for one frame, used in-process or inside a DetectionWorker
+    def __init__(self, config, template_cache=None):
+        self.config = config
+        self.template_cache = template_cache or TemplateCache()
+        
+        # cheap prefilters that narrow down where the template match has to run
+        self.stages = []
+        if config['golden_diff_gate']:
+            self.stages.append(TileChangeGate(config['golden_diff_tile_size'], config['golden_diff_threshold'],
+                                              config['golden_diff_full_scan_every']))
+        if config['golden_color_prefilter']:
+            self.stages.append(ColorCandidateFilter(config['golden_color_full_scan_every']))
+    
+    def reset(self):
+        # after matches were thrown away, so stages that remember the last frame don't write off what they showed
+        for stage in self.stages:
+            stage.reset()
+    
+    def detect(self, frame, stats=None):
+        # returns screen space (score, left, top, width, height) matches, stats counts skipped/partial/full scans
+        stats = {} if stats is None else stats
+        frame_height, frame_width = frame.shape[:2]
+        template = self.template_cache.get(self.config['golden_image_path'], grayscale=self.config['golden_grayscale'],
+                                           scale=self.config['template_scale'])
+        windows = propose_windows(self.stages, frame, template.shape, stats)
+        
+        if not windows:
+            kind = 'skipped'
+        elif windows == [(0, 0, frame_width, frame_height)]:
+            kind = 'full'
+        else:
+            kind = 'partial'
+        stats['scans'] = stats.get('scans', 0) + 1
+        stats[kind] = stats.get(kind, 0) + 1
+        
+        matches = []
+        for left, top, width, height in windows:
+            matches += self.match(frame.crop(left, top, width, height))
+        # prefilter windows can overlap, so the same cookie may have been found twice
+        return non_max_suppression(matches)[:self.config['golden_max_matches']]
+    
+    def match(self, frame):
+        # runs the configured matcher over a frame, or a window cut out of one
+        grayscale = self.config['golden_grayscale']
+        template_scale = self.config['template_scale']
+        template = self.template_cache.get(self.config['golden_image_path'], grayscale=grayscale, scale=template_scale)
+        
+        if self.config['golden_match_mode'] == 'pyramid':
+            scale = 0.5 ** self.config['golden_pyramid_levels']
+            small_template = self.template_cache.get(self.config['golden_image_path'], grayscale=True, scale=template_scale * scale)
+            matches = pyramid_find_matches(frame, template, small_template, self.config['golden_confidence'],
+                                           scale, self.config['golden_pyramid_candidates'])[:self.config['golden_max_matches']]
+        else:
+            matches = find_all_matches(frame, template, self.config['golden_confidence'], self.config['golden_max_matches'])
+        return [(score, frame.offset[0] + left, frame.offset[1] + top, width, height) for score, left, top, width, height in matches]
+
+def _detection_worker_main(config, requests, results):
+    # worker process loop, frames are read straight out of the parent's shared memory segments
+    detector = GoldenDetector(config)
+    segments = {}  # name -> segment, the capture pool keeps handing out the same few
+    
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+        if request == 'reset':
+            detector.reset()
+            continue
+        sequence, segment_name, shape, byte_offset, strides, offset, template_scale = request
+        
+        segment = segments.get(segment_name)
+        if segment is None:
+            if len(segments) >= 8:
+                segments.pop(next(iter(segments))).close()
+            # spawned workers share the parent's resource tracker, so the parent stays in charge of unlinking
+            segment = segments[segment_name] = shared_memory.SharedMemory(name=segment_name)
+        
+        detector.config['template_scale'] = template_scale
+        stats = {}
+        start = time.perf_counter()
+        frame = Frame(np.ndarray(shape, dtype=np.uint8, buffer=segment.buf, offset=byte_offset, strides=strides), offset)
+        try:
+            matches = detector.detect(frame, stats)
+            error = None
+        except Exception as e:
+            matches = []
+            error = str(e)
+        del frame  # the view has to go before the segment can be closed
+        results.put((sequence, matches, stats, (time.perf_counter() - start) * 1000, error))
+    
+    for segment in segments.values():
+        segment.close()
+
+class DetectionWorker:
+    # runs a GoldenDetector in its own process so matching never competes with the clicker threads for the GIL
+    def __init__(self, config, timeout=10):
+        context = multiprocessing.get_context('spawn')
+        self.timeout = timeout
+        self._requests = context.Queue()
+        self._results = context.Queue()
+        worker_config = {key: value for key, value in config.items() if key.startswith('golden_') or key == 'template_scale'}
+        self._process = context.Process(target=_detection_worker_main, args=(worker_config, self._requests, self._results), daemon=True)
+        self._process.start()
+        
+        self._segment = None
+        self._sequence = 0
+        self.last_worker_ms = 0.0
+        self.copies = 0  # frames that weren't in shared memory already
+    
+    def detect(self, frame, template_scale, stats):
+        # frames from the capture pipeline already sit in shared memory and are only described to the worker, anything
+        # else is copied into a segment of our own first. The caller holds frame until this returns, so the pipeline
+        # can't recycle its buffer while the worker reads it
+        location = frame.shared_location()
+        if location is None:
+            if self._segment is None or self._segment.size < frame.image.nbytes:
+                self._release_segment()
+                self._segment = shared_memory.SharedMemory(create=True, size=frame.image.nbytes)
+            shared_frame = np.ndarray(frame.shape, dtype=np.uint8, buffer=self._segment.buf)
+            shared_frame[...] = frame.image
+            location = (self._segment.name, 0, shared_frame.strides)
+            del shared_frame
+            self.copies += 1
+        
+        self._sequence += 1
+        segment_name, byte_offset, strides = location
+        self._requests.put((self._sequence, segment_name, frame.shape, byte_offset, strides, frame.offset, template_scale))
+        while True:
+            if not self._process.is_alive():
+                raise RuntimeError("Detection worker process died")
+            sequence, matches, worker_stats, worker_ms, error = self._results.get(timeout=self.timeout)
+            if sequence == self._sequence:
+                break
+        
+        self.last_worker_ms = worker_ms
+        for key, value in worker_stats.items():
+            stats[key] = stats.get(key, 0) + value
+        if error:
+            raise RuntimeError(f"Detection worker: {error}")
+        return matches
+    
+    def reset(self):
+        self._requests.put('reset')
+    
+    def _release_segment(self):
+        if self._segment is not None:
+            self._segment.close()
+            self._segment.unlink()
+            self._segment = None
+    
+    def close(self):
+        try:
+            self._requests.put(None)
+            self._process.join(timeout=1)
+        finally:
+            if self._process.is_alive():
+                self._process.terminate()
+            self._release_segment()
+
+class CaptureBackend:
+    # grab() returns a BGR frame of the region, written into out when given (so callers can recycle buffers), otherwise
+    # into a new array. allocation_count counts every buffer a grab had to allocate
+    name = 'base'
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.capture_count = 0
+        self.allocation_count = 0
+        self.last_capture_ms = 0.0
+        self.total_capture_ms = 0.0
+        self.max_capture_ms = 0.0
+    
+    def grab(self, region=None, out=None):
+        with self._lock:
+            start = time.perf_counter()
+            frame = self._grab(region, out)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            
+            self.capture_count += 1
+            self.last_capture_ms = elapsed_ms
+            self.total_capture_ms += elapsed_ms
+            self.max_capture_ms = max(self.max_capture_ms, elapsed_ms)
+            return frame
+    
+    def _grab(self, region, out):
+        raise NotImplementedError
+    
+    def stats(self):
+        return {
+            'backend': self.name,
+            'captures': self.capture_count,
+            'allocations': self.allocation_count,
+            'last_ms': self.last_capture_ms,
+            'avg_ms': self.total_capture_ms / self.capture_count if self.capture_count else 0.0,
+            'max_ms': self.max_capture_ms,
+        }
+    
+    def close(self):
+        pass
+
+class PyAutoGuiCapture(CaptureBackend):
+    # fallback, new PIL image (and array) every call
+    name = 'pyautogui'
+    
+    @property
+    def screen_size(self):
+        return tuple(pyautogui.size())
+    
+    def _grab(self, region, out):
+        image = pyautogui.screenshot(region=region)
+        self.allocation_count += 1  # pyautogui always hands back a new image
+        if out is None:
+            self.allocation_count += 1
+        return cv2.cvtColor(np.asarray(image), cv2.COLOR_RGB2BGR, dst=out)
+
+class _XShmSegmentInfo(ctypes.Structure):
+    _fields_ = [('shmseg', ctypes.c_ulong), ('shmid', ctypes.c_int), ('shmaddr', ctypes.c_void_p), ('readOnly', ctypes.c_int)]
+
+class _XImage(ctypes.Structure):
+    # only the leading fields are needed, the rest of the struct is never touched from python
+    _fields_ = [('width', ctypes.c_int), ('height', ctypes.c_int), ('xoffset', ctypes.c_int), ('format', ctypes.c_int),
+                ('data', ctypes.c_void_p), ('byte_order', ctypes.c_int), ('bitmap_unit', ctypes.c_int),
+                ('bitmap_bit_order', ctypes.c_int), ('bitmap_pad', ctypes.c_int), ('depth', ctypes.c_int),
+                ('bytes_per_line', ctypes.c_int), ('bits_per_pixel', ctypes.c_int)]
+
+class XShmCapture(CaptureBackend):
+    # X11 MIT-SHM capture, the server writes straight into a shared segment that is reused between grabs
+    name = 'xshm'
+    
+    def __init__(self):
+        super().__init__()
+        self._xlib = ctypes.CDLL(ctypes.util.find_library('X11') or 'libX11.so.6')
+        self._xext = ctypes.CDLL(ctypes.util.find_library('Xext') or 'libXext.so.6')
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        
+        self._xlib.XOpenDisplay.restype = ctypes.c_void_p
+        self._xlib.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        for name in ('XDefaultScreen', 'XDefaultDepth', 'XDisplayWidth', 'XDisplayHeight'):
+            getattr(self._xlib, name).restype = ctypes.c_int
+        self._xlib.XDefaultScreen.argtypes = [ctypes.c_void_p]
+        for name in ('XDefaultDepth', 'XDisplayWidth', 'XDisplayHeight'):
+            getattr(self._xlib, name).argtypes = [ctypes.c_void_p, ctypes.c_int]
+        self._xlib.XRootWindow.restype = ctypes.c_ulong
+        self._xlib.XRootWindow.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        self._xlib.XDefaultVisual.restype = ctypes.c_void_p
+        self._xlib.XDefaultVisual.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        self._xlib.XSync.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        self._xlib.XFree.argtypes = [ctypes.c_void_p]
+        self._xlib.XCloseDisplay.argtypes = [ctypes.c_void_p]
+        
+        self._xext.XShmQueryExtension.argtypes = [ctypes.c_void_p]
+        self._xext.XShmCreateImage.restype = ctypes.POINTER(_XImage)
+        self._xext.XShmCreateImage.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int, ctypes.c_void_p,
+                                               ctypes.POINTER(_XShmSegmentInfo), ctypes.c_uint, ctypes.c_uint]
+        self._xext.XShmAttach.argtypes = [ctypes.c_void_p, ctypes.POINTER(_XShmSegmentInfo)]
+        self._xext.XShmDetach.argtypes = [ctypes.c_void_p, ctypes.POINTER(_XShmSegmentInfo)]
+        self._xext.XShmGetImage.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.POINTER(_XImage), ctypes.c_int, ctypes.c_int, ctypes.c_ulong]
+        
+        self._libc.shmget.restype = ctypes.c_int
+        self._libc.shmget.argtypes = [ctypes.c_int, ctypes.c_size_t, ctypes.c_int]
+        self._libc.shmat.restype = ctypes.c_void_p
+        self._libc.shmat.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_int]
+        self._libc.shmdt.argtypes = [ctypes.c_void_p]
+        self._libc.shmctl.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_void_p]
+        
+        self._display = self._xlib.XOpenDisplay(None)
+        if not self._display:
+            raise OSError("Could not open X display")
+        if not self._xext.XShmQueryExtension(self._display):
+            self._xlib.XCloseDisplay(self._display)
+            raise OSError("X server does not support MIT-SHM")
+        
+        screen = self._xlib.XDefaultScreen(self._display)
+        self._root = self._xlib.XRootWindow(self._display, screen)
+        self._visual = self._xlib.XDefaultVisual(self._display, screen)
+        self._depth = self._xlib.XDefaultDepth(self._display, screen)
+        self.screen_size = (self._xlib.XDisplayWidth(self._display, screen), self._xlib.XDisplayHeight(self._display, screen))
+        
+        self._image = None
+        self._shminfo = None
+        self._size = None
+        self._bgra = None
+    
+    def _allocate(self, width, height):
+        self._release()
+        
+        shminfo = _XShmSegmentInfo()
+        image = self._xext.XShmCreateImage(self._display, self._visual, self._depth, 2, None, ctypes.byref(shminfo), width, height)  # 2 = ZPixmap
+        if not image:
+            raise OSError("XShmCreateImage failed")
+        if image.contents.bits_per_pixel != 32:
+            self._xlib.XFree(image)
+            raise OSError(f"Unsupported X visual ({image.contents.bits_per_pixel} bits per pixel)")
+        
+        stride = image.contents.bytes_per_line
+        shminfo.shmid = self._libc.shmget(0, stride * height, 0o1000 | 0o600)  # IPC_PRIVATE, IPC_CREAT | rw-------
+        if shminfo.shmid < 0:
+            self._xlib.XFree(image)
+            raise OSError(ctypes.get_errno(), "shmget failed")
+        shminfo.shmaddr = self._libc.shmat(shminfo.shmid, None, 0)
+        shminfo.readOnly = 0
+        image.contents.data = shminfo.shmaddr
+        
+        self._xext.XShmAttach(self._display, ctypes.byref(shminfo))
+        self._xlib.XSync(self._display, 0)
+        self._libc.shmctl(shminfo.shmid, 0, None)  # IPC_RMID, freed once both sides detach
+        
+        raw = (ctypes.c_ubyte * (stride * height)).from_address(shminfo.shmaddr)
+        self._bgra = np.frombuffer(raw, dtype=np.uint8).reshape(height, stride // 4, 4)[:, :width]
+        self._image = image
+        self._shminfo = shminfo
+        self._size = (width, height)
+        self.allocation_count += 1
+    
+    def _release(self):
+        if self._image is None:
+            return
+        self._xext.XShmDetach(self._display, ctypes.byref(self._shminfo))
+        self._xlib.XSync(self._display, 0)
+        self._image.contents.data = None
+        self._xlib.XFree(self._image)
+        self._bgra = None
+        self._libc.shmdt(self._shminfo.shmaddr)
+        self._image = None
+        self._shminfo = None
+        self._size = None
+    
+    def _grab(self, region, out):
+        left, top, width, height = region if region else (0, 0) + self.screen_size
+        if self._size != (width, height):
+            self._allocate(width, height)
+        if not self._xext.XShmGetImage(self._display, self._root, self._image, left, top, 0xFFFFFFFF):  # AllPlanes
+            raise OSError("XShmGetImage failed")
+        if out is None:
+            self.allocation_count += 1
+        # the BGRA to BGR conversion is the only copy, straight into the caller's buffer when there is one
+        return cv2.cvtColor(self._bgra, cv2.COLOR_BGRA2BGR, dst=out)
+    
+    def close(self):
+        with self._lock:
+            self._release()
+            if self._display:
+                self._xlib.XCloseDisplay(self._display)
+                self._display = None
+
+def create_capture_backend(preference='auto'):
+    if preference in ('auto', 'xshm') and sys.platform.startswith('linux'):
+        try:
+            return XShmCapture()
+        except Exception as e:
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] X11 shared memory capture unavailable ({e}), falling back to pyautogui")
+    return PyAutoGuiCapture()
+
+class InputBackend:
+    # mouse output, click(None) clicks wherever the cursor is. Implementations must not sleep between events
+    name = 'base'
+    
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._free = threading.Event()  # cleared while someone holds exclusive input
+        self._free.set()
+        self._owner = None
+        self.on_synthetic_move = None  # called with (x, y) before every move this backend makes
+        self.click_count = 0
+        self.move_count = 0
+        self.preemptions = 0
+        self.total_preempt_ms = 0.0
+        self.max_preempt_ms = 0.0
+    
+    @contextmanager
+    def exclusive(self, resume_position=None):
+        # other threads' clicks wait until the block is done, then carry on at resume_position if one is given.
+        # Clearing _free first stops a tight click loop from winning the lock straight back
+        start = time.perf_counter()
+        self._free.clear()
+        self._lock.acquire()
+        self._owner = threading.get_ident()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.preemptions += 1
+        self.total_preempt_ms += elapsed_ms
+        self.max_preempt_ms = max(self.max_preempt_ms, elapsed_ms)
+        try:
+            yield self
+        finally:
+            try:
+                if resume_position is not None:
+                    self._synthetic_move(resume_position)
+            finally:
+                self._owner = None
+                self._free.set()
+                self._lock.release()
+    
+    def click(self, position=None):
+        if not self._free.is_set() and self._owner != threading.get_ident():
+            self._free.wait()
+        with self._lock:
+            if position is not None:
+                self._synthetic_move(position)
+            self._click()
+            self.click_count += 1
+    
+    def move_to(self, position):
+        with self._lock:
+            self._synthetic_move(position)
+    
+    def _synthetic_move(self, position):
+        x, y = int(position[0]), int(position[1])
+        if self.on_synthetic_move is not None:
+            self.on_synthetic_move(x, y)
+        self._move(x, y)
+        self.move_count += 1
+    
+    def position(self):
+        with self._lock:
+            return Point(*self._position())
+    
+    def _click(self):
+        raise NotImplementedError
+    
+    def _move(self, x, y):
+        raise NotImplementedError
+    
+    def _position(self):
+        raise NotImplementedError
+    
+    def stats(self):
+        return {
+            'backend': self.name,
+            'clicks': self.click_count,
+            'moves': self.move_count,
+            'preemptions': self.preemptions,
+            'avg_preempt_ms': self.total_preempt_ms / self.preemptions if self.preemptions else 0.0,
+            'max_preempt_ms': self.max_preempt_ms,
+        }
+    
+    def close(self):
+        pass
+
+class PyAutoGuiInput(InputBackend):
+    # _pause=False skips the pyautogui.PAUSE sleep (0.1s by default) that otherwise follows every call
+    name = 'pyautogui'
+    
+    def _click(self):
+        pyautogui.click(_pause=False)
+    
+    def _move(self, x, y):
+        pyautogui.moveTo(x, y, _pause=False)
+    
+    def _position(self):
+        return pyautogui.position()
+
+class XTestInput(InputBackend):
+    # X11 XTest, fake button/motion events go straight to the server with a flush instead of a round trip per event
+    name = 'xtest'
+    
+    def __init__(self):
+        super().__init__()
+        self._xlib = ctypes.CDLL(ctypes.util.find_library('X11') or 'libX11.so.6')
+        self._xtst = ctypes.CDLL(ctypes.util.find_library('Xtst') or 'libXtst.so.6')
+        
+        self._xlib.XOpenDisplay.restype = ctypes.c_void_p
+        self._xlib.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        self._xlib.XDefaultScreen.argtypes = [ctypes.c_void_p]
+        self._xlib.XRootWindow.restype = ctypes.c_ulong
+        self._xlib.XRootWindow.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        self._xlib.XQueryPointer.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.POINTER(ctypes.c_ulong), ctypes.POINTER(ctypes.c_ulong),
+                                             ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_int),
+                                             ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_uint)]
+        self._xlib.XFlush.argtypes = [ctypes.c_void_p]
+        self._xlib.XCloseDisplay.argtypes = [ctypes.c_void_p]
+        
+        self._xtst.XTestQueryExtension.argtypes = [ctypes.c_void_p, ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_int),
+                                                   ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_int)]
+        self._xtst.XTestFakeButtonEvent.argtypes = [ctypes.c_void_p, ctypes.c_uint, ctypes.c_int, ctypes.c_ulong]
+        self._xtst.XTestFakeMotionEvent.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_ulong]
+        
+        self._display = self._xlib.XOpenDisplay(None)
+        if not self._display:
+            raise OSError("Could not open X display")
+        unused = ctypes.c_int()
+        if not self._xtst.XTestQueryExtension(self._display, ctypes.byref(unused), ctypes.byref(unused), ctypes.byref(unused), ctypes.byref(unused)):
+            self._xlib.XCloseDisplay(self._display)
+            raise OSError("X server does not support XTest")
+        self._screen = self._xlib.XDefaultScreen(self._display)
+        self._root = self._xlib.XRootWindow(self._display, self._screen)
+    
+    def _click(self):
+        self._xtst.XTestFakeButtonEvent(self._display, 1, 1, 0)
+        self._xtst.XTestFakeButtonEvent(self._display, 1, 0, 0)
+        self._xlib.XFlush(self._display)
+    
+    def _move(self, x, y):
+        self._xtst.XTestFakeMotionEvent(self._display, self._screen, x, y, 0)
+        self._xlib.XFlush(self._display)
+    
+    def _position(self):
+        window = ctypes.c_ulong()
+        x, y, unused = ctypes.c_int(), ctypes.c_int(), ctypes.c_int()
+        mask = ctypes.c_uint()
+        self._xlib.XQueryPointer(self._display, self._root, ctypes.byref(window), ctypes.byref(window),
+                                 ctypes.byref(x), ctypes.byref(y), ctypes.byref(unused), ctypes.byref(unused), ctypes.byref(mask))
+        return x.value, y.value
+    
+    def close(self):
+        with self._lock:
+            if self._display:
+                self._xlib.XCloseDisplay(self._display)
+                self._display = None
+
+class RecordingInput(InputBackend):
+    # touches nothing, just keeps a cursor position and the events it was asked for (dry runs and tests)
+    name = 'null'
+    
+    def __init__(self, start=(0, 0), keep=10000):
+        super().__init__()
+        self.cursor = (int(start[0]), int(start[1]))
+        self.events = deque(maxlen=keep)  # ('click' | 'move', x, y, perf_counter time)
+    
+    def _click(self):
+        self.events.append(('click', self.cursor[0], self.cursor[1], time.perf_counter()))
+    
+    def _move(self, x, y):
+        self.cursor = (x, y)
+        self.events.append(('move', x, y, time.perf_counter()))
+    
+    def _position(self):
+        return self.cursor
+
+def create_input_backend(preference='auto'):
+    if preference == 'null':
+        return RecordingInput()
+    if preference in ('auto', 'xtest') and sys.platform.startswith('linux'):
+        try:
+            return XTestInput()
+        except Exception as e:
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] XTest input unavailable ({e}), falling back to pyautogui")
+    return PyAutoGuiInput()
+
+class MouseMovementWatch:
+    # fed by a pynput mouse listener. Moves the input backend announced through expect() are ours and ignored, any
+    # other move further than tolerance from the anchor (where the big cookie clicker clicks) is the user taking over
+    def __init__(self, tolerance=10, on_user_move=None, expect_for=0.5):
+        self.tolerance = tolerance
+        self.on_user_move = on_user_move
+        self.expect_for = expect_for
+        self.user_moved = threading.Event()
+        self._anchor = None
+        self._expected = deque(maxlen=64)  # (x, y, announced at)
+        self._lock = threading.Lock()
+        self.synthetic_moves = 0
+        self.user_moves = 0
+    
+    def anchor(self, position):
+        with self._lock:
+            self._anchor = (int(position[0]), int(position[1])) if position is not None else None
+            self.user_moved.clear()
+    
+    def expect(self, x, y):
+        with self._lock:
+            self._expected.append((x, y, time.perf_counter()))
+    
+    def on_move(self, x, y):
+        with self._lock:
+            now = time.perf_counter()
+            while self._expected and now - self._expected[0][2] > self.expect_for:
+                self._expected.popleft()
+            for i, (expected_x, expected_y, _) in enumerate(self._expected):
+                if abs(x - expected_x) <= 1 and abs(y - expected_y) <= 1:
+                    # everything announced before it has been overtaken
+                    for _ in range(i + 1):
+                        self._expected.popleft()
+                    self.synthetic_moves += 1
+                    return
+            
+            self.user_moves += 1
+            anchor = self._anchor
+            if anchor is None or (abs(x - anchor[0]) <= self.tolerance and abs(y - anchor[1]) <= self.tolerance):
+                return
+            self._anchor = None  # report once per anchor
+            self.user_moved.set()
+        if self.on_user_move is not None:
+            self.on_user_move(x, y)
+
+class ClickScheduler:
+    # token bucket paced on perf_counter_ns, wait() returns when the next click is allowed. Sleeps most of the gap and
+    # spins the last spin_ns because time.sleep alone overshoots by more than a whole 1ms click interval. The bucket holds
+    # burst_sec worth of clicks so the odd scheduler stall is made up afterwards instead of lowering the rate
+    def __init__(self, rate, spin_ns=200_000, burst_sec=0.005):
+        self.rate = rate  # clicks per second, 0 = unlimited
+        self.burst = max(1, int(rate * burst_sec))
+        self.spin_ns = spin_ns
+        self._interval_ns = int(1e9 / rate) if rate > 0 else 0
+        self._tokens = 1.0
+        self._refilled_ns = time.perf_counter_ns()
+        self._started_ns = self._refilled_ns
+        self._stopped_ns = 0
+        self._last_click_ns = 0
+        self._lock = threading.Lock()  # workers sharing a scheduler take turns waiting for a token
+        
+        # running mean/variance of the gap between clicks (welford), no per click allocation
+        self.clicks = 0
+        self._gap_mean = 0.0
+        self._gap_m2 = 0.0
+    
+    def wait(self, stop_event=None):
+        with self._lock:
+            return self._wait(stop_event)
+    
+    def _wait(self, stop_event):
+        if self._interval_ns:
+            while True:
+                now = time.perf_counter_ns()
+                self._tokens = min(self.burst, self._tokens + (now - self._refilled_ns) / self._interval_ns)
+                self._refilled_ns = now
+                if self._tokens >= 1:
+                    break
+                remaining = int((1 - self._tokens) * self._interval_ns)
+                if stop_event is not None and stop_event.is_set():
+                    return False
+                if remaining > self.spin_ns:
+                    time.sleep((remaining - self.spin_ns) / 1e9)
+                else:
+                    deadline = now + remaining
+                    while time.perf_counter_ns() < deadline:
+                        pass
+            self._tokens -= 1
+        
+        now = time.perf_counter_ns()
+        if self._last_click_ns:
+            gap = now - self._last_click_ns
+            count = self.clicks  # gaps seen so far, including this one
+            delta = gap - self._gap_mean
+            self._gap_mean += delta / count
+            self._gap_m2 += delta * (gap - self._gap_mean)
+        self._last_click_ns = now
+        self.clicks += 1
+        return True
+    
+    def stop(self):
+        # freezes the achieved rate so time spent stopped doesn't count against it
+        self._stopped_ns = time.perf_counter_ns()
+    
+    def stats(self):
+        elapsed = ((self._stopped_ns or time.perf_counter_ns()) - self._started_ns) / 1e9
+        gaps = self.clicks - 1
+        return {
+            'target_cps': self.rate,
+            'achieved_cps': self.clicks / elapsed if elapsed > 0 else 0.0,
+            'clicks': self.clicks,
+            'mean_gap_ms': self._gap_mean / 1e6 if gaps > 0 else 0.0,
+            'jitter_ms': (self._gap_m2 / gaps) ** 0.5 / 1e6 if gaps > 1 else 0.0,  # standard deviation of the gap
+        }
+
+class ShardedCounter:
+    # each writer bumps its own one item list (shard[0] += 1) so the hot path never takes a lock, shards are summed on
+    # read and folded into the base when their writer is done with them
+    def __init__(self, value=0):
+        self._base = value
+        self._shards = []
+        self._lock = threading.Lock()
+    
+    def shard(self):
+        shard = [0]
+        with self._lock:
+            self._shards.append(shard)
+        return shard
+    
+    def release(self, shard):
+        with self._lock:
+            self._base += shard[0]
+            self._shards.remove(shard)
+    
+    def add(self, amount=1):
+        with self._lock:
+            self._base += amount
+    
+    def value(self):
+        with self._lock:
+            return self._base + sum(shard[0] for shard in self._shards)
+
+class ClickWorkerPool:
+    # owns the click threads. Each run gets its own stop event, so a worker left over from an earlier run can never be
+    # switched back on, and start() refuses to add threads while old ones are still shutting down
+    def __init__(self, size=1):
+        self.size = max(1, size)
+        self._threads = []
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.started = 0
+        self.lingering = 0  # workers that outlived a stop() timeout
+    
+    def start(self, work):
+        # work(worker_id, stop_event) runs in each thread until stop_event is set
+        with self._lock:
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            if self._threads:
+                return not self._stop.is_set()
+            self._stop = threading.Event()
+            for worker_id in range(self.size):
+                thread = threading.Thread(target=work, args=(worker_id, self._stop), name=f"click-worker-{worker_id}")
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+            self.started += self.size
+            return True
+    
+    def stop(self, timeout=1.0):
+        # returns True once every worker has exited
+        with self._lock:
+            self._stop.set()
+            deadline = time.perf_counter() + timeout
+            for thread in self._threads:
+                thread.join(max(0.0, deadline - time.perf_counter()))
+            alive = [thread for thread in self._threads if thread.is_alive()]
+            self.lingering += len(alive)
+            self._threads = alive
+            return not alive
+    
+    @property
+    def running(self):
+        return not self._stop.is_set() and self.active_count() > 0
+    
+    def active_count(self):
+        return sum(1 for thread in self._threads if thread.is_alive())
+    
+    def stats(self):
+        return {'size': self.size, 'active': self.active_count(), 'started': self.started, 'lingering': self.lingering}
+
+def union_regions(regions):
+    # smallest (left, top, width, height) covering all regions, None (whole screen) if any of them is None
+    if not regions or any(region is None for region in regions):
+        return None
+    left = min(region[0] for region in regions)
+    top = min(region[1] for region in regions)
+    right = max(region[0] + region[2] for region in regions)
+    bottom = max(region[1] + region[3] for region in regions)
+    return (left, top, right - left, bottom - top)
+
+class FrameBufferPool:
+    # shared memory frame buffers recycled between captures. A buffer goes back to the pool once the Frame using it
+    # (and every crop of it) has been dropped, and the detection worker process maps it instead of getting a copy
+    def __init__(self, size):
+        self.size = size
+        self._free = []
+        self._in_use = 0
+        self._closed = False
+        self._lock = threading.Lock()
+        self.allocations = 0
+        self.misses = 0  # captures that found every buffer in use and got a private array instead
+    
+    def acquire(self, shape):
+        # (segment, array view) to capture into, (None, None) if all size buffers are still held by frames
+        nbytes = int(np.prod(shape))
+        with self._lock:
+            segment = None
+            while self._free and segment is None:
+                segment = self._free.pop()
+                if segment.size < nbytes:
+                    self._destroy(segment)  # the capture region grew
+                    segment = None
+            if segment is None:
+                if self._in_use + len(self._free) >= self.size:
+                    self.misses += 1
+                    return None, None
+                segment = shared_memory.SharedMemory(create=True, size=nbytes)
+                self.allocations += 1
+            self._in_use += 1
+        return segment, np.ndarray(shape, dtype=np.uint8, buffer=segment.buf)
+    
+    def attach(self, frame, segment):
+        # segment comes back to the pool when frame is garbage collected
+        frame.shared_name = segment.name
+        weakref.finalize(frame, self.release, segment)
+    
+    def release(self, segment):
+        with self._lock:
+            self._in_use -= 1
+            if self._closed:
+                self._destroy(segment)
+            else:
+                self._free.append(segment)
+    
+    def _destroy(self, segment):
+        try:
+            segment.close()
+        except BufferError:
+            pass  # a stray view still points at it, the mapping goes with that view
+        segment.unlink()
+    
+    def stats(self):
+        with self._lock:
+            return {'buffers': self._in_use + len(self._free), 'in_use': self._in_use, 'allocations': self.allocations, 'misses': self.misses}
+    
+    def close(self):
+        # free buffers go now, ones still held by frames as their frames are dropped
+        with self._lock:
+            self._closed = True
+            free, self._free = self._free, []
+            for segment in free:
+                self._destroy(segment)
+
+class CapturePipeline:
+    # the single capture stage, frames are captured when a subscriber is due one (so slow detectors slow capture down
+    # instead of piling up a backlog) and kept in a small slot buffer where the newest frame always wins
+    def __init__(self, capture, slots=1):
+        self.capture = capture
+        self._slots = deque(maxlen=max(1, slots))
+        # enough buffers for the slot buffer, the frame being captured and one held by each detector thread
+        self._pool = FrameBufferPool(self._slots.maxlen + 3)
+        self._subscribers = {}
+        self._condition = threading.Condition()
+        self._sequence = 0
+        self.closed = False  # set once run() has finished, next_frame() then returns None straight away
+        self.captured = 0
+        self.dropped = 0  # frames pushed out of the buffer before anyone used them
+    
+    def subscribe(self, name, region=None, interval=0.1):
+        with self._condition:
+            # frames captured before someone subscribed are never handed to them, however long they sat in the buffer
+            subscriber = self._subscribers.setdefault(name, {
+                'last_sequence': 0, 'last_pickup': 0.0, 'subscribed_at': time.perf_counter(), 'waiting': False,
+                'frames': 0, 'total_age_ms': 0.0, 'max_age_ms': 0.0,
+            })
+            subscriber['region'] = tuple(region) if region else None
+            subscriber['interval'] = interval
+            self._condition.notify_all()
+    
+    def unsubscribe(self, name):
+        with self._condition:
+            self._subscribers.pop(name, None)
+            self._condition.notify_all()
+    
+    @staticmethod
+    def _due_at(subscriber):
+        # earliest capture time a subscriber's next frame may have
+        return max(subscriber['last_pickup'] + subscriber['interval'], subscriber['subscribed_at'])
+    
+    def _newest(self, region, after_sequence=0, captured_after=0.0, max_age=None):
+        now = time.perf_counter()
+        for frame in reversed(self._slots):
+            if frame.sequence > after_sequence and frame.captured_at >= captured_after and frame.covers(region) and \
+               (max_age is None or now - frame.captured_at <= max_age):
+                return frame
+        return None
+    
+    def next_frame(self, name=None, region=None, timeout=1.0, max_age=None):
+        # newest frame covering region, None on timeout. Subscribers get a frame newer than their last one, captured
+        # no earlier than their interval allows, anyone else just gets whatever is in the buffer
+        deadline = time.perf_counter() + timeout
+        with self._condition:
+            subscriber = self._subscribers.get(name)
+            while True:
+                if subscriber is None:
+                    frame = self._newest(region, max_age=max_age)
+                else:
+                    frame = self._newest(region, subscriber['last_sequence'], self._due_at(subscriber), max_age)
+                if frame is not None:
+                    break
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0 or self.closed:
+                    if subscriber is not None:
+                        subscriber['waiting'] = False
+                    return None
+                if subscriber is not None and not subscriber['waiting']:
+                    subscriber['waiting'] = True
+                    self._condition.notify_all()
+                self._condition.wait(remaining)
+            
+            frame.consumed += 1
+            if subscriber is not None:
+                age_ms = (time.perf_counter() - frame.captured_at) * 1000
+                subscriber['waiting'] = False
+                subscriber['last_sequence'] = frame.sequence
+                subscriber['last_pickup'] = time.perf_counter()
+                subscriber['frames'] += 1
+                subscriber['total_age_ms'] += age_ms
+                subscriber['max_age_ms'] = max(subscriber['max_age_ms'], age_ms)
+            return frame
+    
+    def stats(self):
+        with self._condition:
+            subscribers = {name: {'frames': sub['frames'], 'avg_age_ms': sub['total_age_ms'] / sub['frames'] if sub['frames'] else 0.0,
+                                  'max_age_ms': sub['max_age_ms']} for name, sub in self._subscribers.items()}
+            return {'captured': self.captured, 'dropped': self.dropped, 'slots': self._slots.maxlen, 'subscribers': subscribers,
+                    'buffers': self._pool.stats()}
+    
+    def close(self):
+        # wakes everyone waiting in next_frame()
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+    
+    def run(self, stop_event):
+        while not stop_event.is_set():
+            with self._condition:
+                waiting = [sub for sub in self._subscribers.values() if sub['waiting']]
+                if not waiting:
+                    self._condition.wait(0.1)
+                    continue
+                due_in = min(self._due_at(sub) for sub in waiting) - time.perf_counter()
+                if due_in > 0:
+                    self._condition.wait(min(due_in, 0.1))
+                    continue
+                # cover everyone, not just whoever is due, so the frame can be shared
+                region = union_regions([sub['region'] for sub in self._subscribers.values()])
+            
+            tick_start = time.perf_counter()
+            left, top, width, height = region if region else (0, 0) + tuple(self.capture.screen_size)
+            segment, buffer = self._pool.acquire((height, width, 3))
+            try:
+                image = self.capture.grab(region, out=buffer)
+            except Exception as e:
+                if segment is not None:
+                    self._pool.release(segment)
+                print(f"[{datetime.now().strftime('%H:%M:%S')}] Error capturing screen: {e}")
+                stop_event.wait(1)
+                continue
+            
+            with self._condition:
+                self._sequence += 1
+                self.captured += 1
+                if len(self._slots) == self._slots.maxlen and not self._slots[0].consumed:
+                    self.dropped += 1
+                frame = Frame(image, region[:2] if region else (0, 0), self._sequence, tick_start, full_screen=region is None)
+                if image is buffer:
+                    self._pool.attach(frame, segment)
+                elif segment is not None:
+                    self._pool.release(segment)  # the backend didn't use it (a region off the edge of the screen)
+                self._slots.append(frame)
+                
+                # whoever this frame serves stops counting as waiting, otherwise the next loop would capture again
+                # before they had a chance to pick it up
+                for subscriber in self._subscribers.values():
+                    if subscriber['waiting'] and frame.covers(subscriber['region']) and frame.captured_at >= self._due_at(subscriber):
+                        subscriber['waiting'] = False
+                self._condition.notify_all()
+        
+        self.close()
+        self._slots.clear()
+        self._pool.close()
+        self.capture.close()
+
+def write_atomic(path, data):
+    # readers (and a crash half way through) see either the old file or the new one, never a truncated mix
+    temp_path = f"{path}.{threading.get_ident()}.tmp"  # per thread, the GUI and the persistence thread can both save settings
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+class StatsJournal:
+    # append-only log of counter totals in fixed size records, so a write torn by a crash only loses the last record.
+    # Writes go to the OS straight away but are fsynced in batches, compact() rewrites it down to one record per counter
+    RECORD = struct.Struct('<dBq')  # time, counter, total
+    COUNTERS = ('golden', 'big')
+    
+    def __init__(self, path, sync_every=64, sync_interval=1.0):
+        self.path = path
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._file = None
+        self._last = {}
+        self._unsynced = 0
+        self._synced_at = time.time()
+        self.records = 0
+        self.syncs = 0
+    
+    def load(self):
+        # latest total of each counter, {} if there is no journal yet
+        totals = {}
+        if not os.path.exists(self.path):
+            return totals
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        usable = len(data) - len(data) % self.RECORD.size
+        for _, counter, total in self.RECORD.iter_unpack(data[:usable]):
+            if counter < len(self.COUNTERS):
+                totals[self.COUNTERS[counter]] = total
+        self._last = dict(totals)
+        return totals
+    
+    def record(self, counter, total):
+        with self._lock:
+            if self._last.get(counter) == total:
+                return
+            if self._file is None:
+                self._file = open(self.path, 'ab')
+            self._file.write(self.RECORD.pack(time.time(), self.COUNTERS.index(counter), total))
+            self._file.flush()
+            self._last[counter] = total
+            self.records += 1
+            self._unsynced += 1
+            if self._unsynced >= self.sync_every or time.time() - self._synced_at >= self.sync_interval:
+                self._sync()
+    
+    def _sync(self):
+        if self._file is not None and self._unsynced:
+            os.fsync(self._file.fileno())
+            self.syncs += 1
+        self._unsynced = 0
+        self._synced_at = time.time()
+    
+    def sync(self):
+        with self._lock:
+            self._sync()
+    
+    def compact(self, totals):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            now = time.time()
+            data = b''.join(self.RECORD.pack(now, self.COUNTERS.index(counter), total) for counter, total in totals.items())
+            write_atomic(self.path, data)
+            self._last = dict(totals)
+            self._unsynced = 0
+    
+    def close(self):
+        with self._lock:
+            self._sync()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+class PersistenceFlusher:
+    # disk writes happen on this thread, callers only mark what changed. Each kind is written at most once per debounce
+    # seconds, however often it's marked, and whatever is still dirty gets written by stop()
+    def __init__(self, writers, debounce=5.0):
+        self.writers = writers  # kind -> function doing the write
+        self.debounce = debounce
+        self._dirty = set()
+        self._written_at = {kind: 0.0 for kind in writers}
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = None
+        self.marks = 0
+        self.writes = 0
+    
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="persistence")
+        self._thread.daemon = True
+        self._thread.start()
+    
+    def mark_dirty(self, *kinds):
+        with self._condition:
+            self._dirty.update(kinds)
+            self.marks += 1
+            self._condition.notify()
+    
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._dirty and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                now = time.monotonic()
+                due = [kind for kind in self._dirty if now - self._written_at[kind] >= self.debounce]
+                if not due:
+                    self._condition.wait(min(self._written_at[kind] + self.debounce for kind in self._dirty) - now)
+                    continue
+                self._dirty.difference_update(due)
+            for kind in due:
+                self._write(kind)
+    
+    def _write(self, kind):
+        self._written_at[kind] = time.monotonic()
+        try:
+            self.writers[kind]()
+            self.writes += 1
+        except Exception as e:
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] Error writing {kind}: {e}")
+    
+    def stop(self, timeout=5.0):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        if self._thread:
+            self._thread.join(timeout)
+        # final flush, on the caller's thread
+        with self._condition:
+            remaining = list(self._dirty)
+            self._dirty.clear()
+        for kind in remaining:
+            self._write(kind)
+
+class HistoryStore:
+    # sqlite history of clicks (per second buckets) and golden cookie clicks. record_*() only queue, one writer thread
+    # owns the connection and writes each batch in a single transaction, so clicking never waits on the database
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS click_buckets (second INTEGER PRIMARY KEY, big INTEGER NOT NULL DEFAULT 0, "
+        "golden INTEGER NOT NULL DEFAULT 0)",
+        "CREATE TABLE IF NOT EXISTS golden_events (id INTEGER PRIMARY KEY, time REAL NOT NULL, x INTEGER, y INTEGER, "
+        "confidence REAL, latency_ms REAL)",
+        "CREATE INDEX IF NOT EXISTS golden_events_time ON golden_events (time)",
+    )
+    
+    def __init__(self, path, flush_interval=1.0, max_batch=1000):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = None
+        self.batches = 0
+        self.rows = 0
+    
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="history")
+        self._thread.daemon = True
+        self._thread.start()
+    
+    def record_clicks(self, kind, count, at=None):
+        if count:
+            self._queue.put(('clicks', kind, count, at or time.time()))
+    
+    def record_golden(self, position, confidence, latency_ms, at=None):
+        self._queue.put(('golden', int(position[0]), int(position[1]), confidence, latency_ms, at or time.time()))
+    
+    def _run(self):
+        connection = sqlite3.connect(self.path)
+        connection.execute("PRAGMA journal_mode=WAL")  # so queries can run while the bot writes
+        for statement in self.SCHEMA:
+            connection.execute(statement)
+        connection.commit()
+        
+        closing = False
+        while not closing:
+            batch = []
+            try:
+                batch.append(self._queue.get(timeout=self.flush_interval))
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.max_batch:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+            except queue.Empty:
+                pass
+            if None in batch:
+                closing = True
+                batch = [item for item in batch if item is not None]
+            if batch:
+                try:
+                    self._write(connection, batch)
+                except Exception as e:
+                    print(f"[{datetime.now().strftime('%H:%M:%S')}] Error writing click history: {e}")
+        connection.close()
+    
+    def _write(self, connection, batch):
+        # clicks are summed into their buckets here, so a busy second is still one row
+        buckets = {}
+        events = []
+        for item in batch:
+            if item[0] == 'clicks':
+                _, kind, count, at = item
+                bucket = buckets.setdefault(int(at), {'big': 0, 'golden': 0})
+                bucket[kind] += count
+            else:
+                _, x, y, confidence, latency_ms, at = item
+                events.append((at, x, y, confidence, latency_ms))
+        
+        with connection:
+            connection.executemany(
+                "INSERT INTO click_buckets (second, big, golden) VALUES (?, ?, ?) "
+                "ON CONFLICT(second) DO UPDATE SET big = big + excluded.big, golden = golden + excluded.golden",
+                [(second, bucket['big'], bucket['golden']) for second, bucket in buckets.items()])
+            connection.executemany("INSERT INTO golden_events (time, x, y, confidence, latency_ms) VALUES (?, ?, ?, ?, ?)", events)
+        self.batches += 1
+        self.rows += len(buckets) + len(events)
+    
+    def close(self, timeout=5.0):
+        # writes everything still queued
+        if self._thread and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+    
+    @staticmethod
+    def query(path, start, end):
+        # click rates and golden cookie stats for start <= time < end (unix seconds)
+        connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            big, golden, active_seconds = connection.execute(
+                "SELECT COALESCE(SUM(big), 0), COALESCE(SUM(golden), 0), COUNT(*) FROM click_buckets WHERE second >= ? AND second < ?",
+                (int(start), int(end))).fetchone()
+            times = [row[0] for row in connection.execute(
+                "SELECT time FROM golden_events WHERE time >= ? AND time < ? ORDER BY time", (start, end))]
+            confidence, latency, max_latency = connection.execute(
+                "SELECT AVG(confidence), AVG(latency_ms), MAX(latency_ms) FROM golden_events WHERE time >= ? AND time < ?",
+                (start, end)).fetchone()
+        finally:
+            connection.close()
+        
+        duration = max(1e-9, end - start)
+        gaps = [b - a for a, b in zip(times, times[1:])]
+        return {
+            'start': start,
+            'end': end,
+            'big_clicks': big,
+            'golden_clicks': golden,
+            'active_seconds': active_seconds,
+            'big_per_sec': big / duration,
+            'big_per_active_sec': big / active_seconds if active_seconds else 0.0,
+            'golden_per_hour': golden * 3600 / duration,
+            'golden_events': len(times),
+            'golden_gap_median_sec': percentile(gaps, 50) if gaps else None,
+            'golden_gap_min_sec': min(gaps) if gaps else None,
+            'golden_confidence_avg': confidence,
+            'golden_latency_avg_ms': latency,
+            'golden_latency_max_ms': max_latency,
+        }
 
 class CookieClickerBot:
     def __init__(self):
@@ -32,14 +1734,45 @@ class CookieClickerBot:
         self.big_running = False
         self.stop_event = threading.Event()
         
+        # every big cookie click since startup, session and total are offsets from it
+        self.big_click_counter = ShardedCounter()
+        self._big_session_offset = 0
+        self._big_total_offset = 0
+        
         self.golden_cookies_clicked_session = 0
         self.golden_cookies_clicked_total = 0
         self.big_cookies_clicked_session = 0
         self.big_cookies_clicked_total = 0
         
         self.config = self.load_config()
-        self.golden_cookies_clicked_total = self.config['golden_cookies_clicked_total']
-        self.big_cookies_clicked_total = self.config['big_cookies_clicked_total']
+        self.stats_journal = StatsJournal(STATS_JOURNAL_FILE)
+        self.persistence = PersistenceFlusher({'settings': lambda: self.save_config(show_confirmation=False),
+                                               'counters': self.journal_counters}, self.config['persist_debounce_sec'])
+        self.persistence.start()
+        self.history = None
+        self._history_big_clicks = 0  # big_click_counter value already sent to the history
+        self._history_lock = threading.Lock()
+        if self.config['history_enabled']:
+            self.history = HistoryStore(HISTORY_FILE)
+            self.history.start()
+        self.template_cache = TemplateCache()
+        self.capture_backends = {}
+        self.input = None
+        self.click_scheduler = None
+        self.click_pool = None
+        self.big_cookie_target = None  # where the big cookie clicker is clicking, golden clicks put the cursor back here
+        self.golden_scan_stats = {'scans': 0, 'skipped': 0, 'partial': 0, 'full': 0, 'skipped_unchanged': 0, 'skipped_no_color': 0}
+        self.golden_detection_timing = {'detections': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'backend': 'in-process'}
+        self.golden_frame_age = {'clicks': 0, 'last_ms': 0.0, 'total_ms': 0.0, 'max_ms': 0.0, 'stale': 0}  # capture to click
+        # totals saved by older versions are still in the settings file, only used until there is a journal
+        try:
+            totals = self.stats_journal.load()
+        except Exception as e:
+            print(f"Error loading stats journal: {e}")
+            totals = {}
+        self.golden_cookies_clicked_total = totals.get('golden', self.config['golden_cookies_clicked_total'])
+        self.big_cookies_clicked_total = totals.get('big', self.config['big_cookies_clicked_total'])
+        self.compact_stats_journal()
         
         self.golden_status_label = None
         self.big_status_label = None
@@ -52,8 +1785,28 @@ class CookieClickerBot:
         
         self.golden_watcher_thread = None
         self.big_clicker_thread = None
+        self.capture_thread = None
+        self.capture_pipeline = None
         self.keyboard_listener = None
+        self.mouse_listener = None
+        self.mouse_watch = MouseMovementWatch(on_user_move=self.on_user_mouse_move)
         
+    @property
+    def big_cookies_clicked_session(self):
+        return self.big_click_counter.value() - self._big_session_offset
+    
+    @big_cookies_clicked_session.setter
+    def big_cookies_clicked_session(self, value):
+        self._big_session_offset = self.big_click_counter.value() - value
+    
+    @property
+    def big_cookies_clicked_total(self):
+        return self.big_click_counter.value() + self._big_total_offset
+    
+    @big_cookies_clicked_total.setter
+    def big_cookies_clicked_total(self, value):
+        self._big_total_offset = value - self.big_click_counter.value()
+    
     def load_config(self):
         if os.path.exists(CONFIG_FILE):
             try:
@@ -70,13 +1823,11 @@ class CookieClickerBot:
         return DEFAULT_CONFIG.copy()
     
     def save_config(self, show_confirmation=True):
+        # settings only, the counters go to the stats journal
         try:
-            self.config['golden_cookies_clicked_total'] = self.golden_cookies_clicked_total
-            self.config['big_cookies_clicked_total'] = self.big_cookies_clicked_total
+            settings = {key: value for key, value in self.config.items() if key not in COUNTER_KEYS}
+            write_atomic(CONFIG_FILE, pickle.dumps(settings))
             
-            with open(CONFIG_FILE, 'wb') as f:
-                pickle.dump(self.config, f)
-                
             if show_confirmation:
                 messagebox.showinfo("Settings Saved", "Your settings have been saved successfully!")
             return True
@@ -86,6 +1837,28 @@ class CookieClickerBot:
             print(f"Error saving config: {e}")
             return False
     
+    def record_big_click_history(self):
+        # big clicks since the last call go into the current second's bucket
+        if self.history is None:
+            return
+        with self._history_lock:
+            clicks = self.big_click_counter.value()
+            self.history.record_clicks('big', clicks - self._history_big_clicks)
+            self._history_big_clicks = clicks
+    
+    def journal_counters(self):
+        try:
+            self.stats_journal.record('golden', self.golden_cookies_clicked_total)
+            self.stats_journal.record('big', self.big_cookies_clicked_total)
+        except Exception as e:
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] Error writing stats journal: {e}")
+    
+    def compact_stats_journal(self):
+        try:
+            self.stats_journal.compact({'golden': self.golden_cookies_clicked_total, 'big': self.big_cookies_clicked_total})
+        except Exception as e:
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] Error compacting stats journal: {e}")
+    
     def toggle_golden_bot(self):
         self.golden_running = not self.golden_running
         self.update_status_display()
@@ -98,6 +1871,105 @@ class CookieClickerBot:
         status = "ON" if self.big_running else "OFF"
         print(f"[{datetime.now().strftime('%H:%M:%S')}] Big Cookie clicking toggled {status}")
     
+    def learn_golden_scan_region(self, big_cookie_position):
+        if not self.config['golden_scan_region_auto']:
+            return
+        region = estimate_game_region(big_cookie_position, pyautogui.size(),
+                                      self.config['golden_scan_region_store_width'] * self.config['template_scale'])
+        if region is None or region == self.config['golden_scan_region']:
+            return
+        self.config['golden_scan_region'] = region
+        self.persistence.mark_dirty('settings')
+        print(f"[{datetime.now().strftime('%H:%M:%S')}] Golden cookie scan region set to {region}")
+    
+    def get_golden_scan_region(self):
+        region = self.config['golden_scan_region']
+        if region is None:
+            return None
+        region = tuple(region)
+        if not region_fits_screen(region, pyautogui.size()):
+            # screen layout changed since the region was learned
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] Golden cookie scan region {region} no longer fits the screen, scanning full screen")
+            self.config['golden_scan_region'] = None
+            return None
+        return region
+    
+    def estimate_template_scale(self, frame):
+        # browser zoom probably changed, find the template size that matches the big cookie now
+        variants = self.template_cache.variants(self.config['big_image_path'], TEMPLATE_SCALES, grayscale=True)
+        scale, location = estimate_template_scale(frame, variants, self.config['big_confidence'])
+        
+        timestamp = datetime.now().strftime('%H:%M:%S')
+        if scale is None:
+            print(f"[{timestamp}] Could not match the big cookie at any zoom level")
+            return None
+        if scale != self.config['template_scale']:
+            print(f"[{timestamp}] Browser zoom changed, using templates at {scale:.2f}x")
+            self.config['template_scale'] = scale
+            self.persistence.mark_dirty('settings')
+        return location
+    
+    def screen_fingerprint(self):
+        # if any of this changed the old big cookie position can't be trusted
+        screen_width, screen_height = pyautogui.size()
+        return (int(screen_width), int(screen_height), self.config['template_scale'])
+    
+    def remember_big_cookie_position(self, position):
+        position = (int(position[0]), int(position[1]))
+        fingerprint = self.screen_fingerprint()
+        if position == self.config['big_cookie_position'] and fingerprint == self.config['big_cookie_fingerprint']:
+            return
+        self.config['big_cookie_position'] = position
+        self.config['big_cookie_fingerprint'] = fingerprint
+        self.persistence.mark_dirty('settings')
+    
+    def big_cookie_templates(self):
+        # every visual state of the big cookie, so it's found wherever the cursor is
+        grayscale = self.config['big_grayscale']
+        template_scale = self.config['template_scale']
+        templates = [self.template_cache.get(self.config['big_image_path'], grayscale=grayscale, scale=template_scale * state_scale)
+                     for state_scale in self.config['big_state_scales']]
+        for path in self.config['big_state_image_paths']:
+            if os.path.exists(path):
+                templates.append(self.template_cache.get(path, grayscale=grayscale, scale=template_scale))
+        return templates
+    
+    def grab_frame(self, name, region=None, timeout=2, max_age=0.5):
+        # one-off frame from the shared pipeline, reuses the latest frame if it's fresh and already covers the region.
+        # Otherwise waits for one captured after this call, max_age leaves room for a slow full screen grab
+        pipeline = self.capture_pipeline
+        frame = pipeline.next_frame(region=region, timeout=0, max_age=0.1)
+        if frame is not None:
+            return frame
+        pipeline.subscribe(name, region, 0)
+        try:
+            return pipeline.next_frame(name, region, timeout=timeout, max_age=max_age)
+        finally:
+            pipeline.unsubscribe(name)
+    
+    def revalidate_big_cookie_position(self):
+        # match only a small crop around the last known position, None means a full search is needed
+        position = self.config['big_cookie_position']
+        if position is None or self.config['big_cookie_fingerprint'] != self.screen_fingerprint():
+            return None
+        
+        templates = self.big_cookie_templates()
+        template_height = max(template.shape[0] for template in templates)
+        template_width = max(template.shape[1] for template in templates)
+        screen_width, screen_height = pyautogui.size()
+        left = max(0, position[0] - template_width)
+        top = max(0, position[1] - template_height)
+        width = min(screen_width - left, template_width * 2)
+        height = min(screen_height - top, template_height * 2)
+        if width < template_width or height < template_height:
+            return None
+        
+        region = (left, top, width, height)
+        frame = self.grab_frame('big', region)
+        if frame is None:
+            return None
+        return locate_best_center(templates, frame.region(region), self.config['big_confidence'])
+    
     def update_status_display(self):
         if self.golden_status_label:
             status_text = "ON" if self.golden_running else "OFF"
@@ -169,6 +2041,12 @@ class CookieClickerBot:
             self.big_session_counter_label.config(text=session_text)
             self.big_total_counter_label.config(text=total_text)
     
+    def on_user_mouse_move(self, x, y):
+        # runs on the pynput listener thread, the click workers see big_running go False on their next click
+        if self.big_running:
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] Mouse moved by user to {(x, y)}, stopping big cookie clicker")
+            self.toggle_big_bot()
+    
     def on_key_press(self, key):
         try:
             if hasattr(key, 'name'):
@@ -182,132 +2060,290 @@ class CookieClickerBot:
         except AttributeError:
             pass
     
-    def golden_cookie_watcher(self):
-        while not self.stop_event.is_set():
-            if self.golden_running:
-                try:
-                    location = pyautogui.locateCenterOnScreen(self.config['golden_image_path'], confidence=self.config['golden_confidence'])
-                    
-                    if location:
-                        self.golden_cookies_clicked_session += 1
-                        self.golden_cookies_clicked_total += 1
-                        self.update_counter_display()
+    def log_stats(self):
+        timestamp = datetime.now().strftime('%H:%M:%S')
+        for owner, capture in self.capture_backends.items():
+            stats = capture.stats()
+            print(f"[{timestamp}] {owner.capitalize()} capture ({stats['backend']}): {stats['captures']} captures, "
+                  f"{stats['allocations']} buffer allocations, avg {stats['avg_ms']:.2f}ms, max {stats['max_ms']:.2f}ms")
+        
+        if self.input is not None:
+            input_stats = self.input.stats()
+            print(f"[{timestamp}] Input ({input_stats['backend']}): {input_stats['clicks']} clicks, {input_stats['moves']} moves, "
+                  f"{input_stats['preemptions']} golden preemptions (avg {input_stats['avg_preempt_ms']:.3f}ms, max {input_stats['max_preempt_ms']:.3f}ms)")
+        
+        print(f"[{timestamp}] Persistence: {self.persistence.writes} writes for {self.persistence.marks} changes "
+              f"(at most one per {self.persistence.debounce}s per kind), {self.stats_journal.records} journal records, "
+              f"{self.stats_journal.syncs} fsyncs")
+        
+        if self.history is not None:
+            print(f"[{timestamp}] Click history: {self.history.rows} rows written in {self.history.batches} batches")
+        
+        if self.mouse_listener is not None:
+            print(f"[{timestamp}] Mouse events: {self.mouse_watch.synthetic_moves} of our own moves, {self.mouse_watch.user_moves} user moves")
+        
+        if self.click_pool is not None:
+            pool_stats = self.click_pool.stats()
+            print(f"[{timestamp}] Click workers: {pool_stats['active']}/{pool_stats['size']} active, {pool_stats['started']} started, "
+                  f"{pool_stats['lingering']} outlived a stop")
+        
+        if self.click_scheduler is not None:
+            rate = self.click_scheduler.stats()
+            target = f"{rate['target_cps']:.0f}/s" if rate['target_cps'] else "unlimited"
+            print(f"[{timestamp}] Big cookie click rate: {rate['achieved_cps']:.0f}/s (target {target}), "
+                  f"mean gap {rate['mean_gap_ms']:.3f}ms, jitter {rate['jitter_ms']:.3f}ms over {rate['clicks']} clicks")
+        
+        scan_stats = self.golden_scan_stats
+        print(f"[{timestamp}] Golden scans: {scan_stats['scans']} total, {scan_stats['skipped']} skipped "
+              f"({scan_stats['skipped_unchanged']} unchanged, {scan_stats['skipped_no_color']} no golden colour), "
+              f"{scan_stats['partial']} partial, {scan_stats['full']} full")
+        
+        if self.capture_pipeline:
+            pipeline_stats = self.capture_pipeline.stats()
+            buffers = pipeline_stats['buffers']
+            print(f"[{timestamp}] Capture pipeline: {pipeline_stats['captured']} frames captured, {pipeline_stats['dropped']} dropped unused "
+                  f"({pipeline_stats['slots']} slot buffer), {buffers['buffers']} shared frame buffers "
+                  f"({buffers['allocations']} allocated, {buffers['misses']} captures found none free)")
+            for name, subscriber in pipeline_stats['subscribers'].items():
+                print(f"[{timestamp}]   {name}: {subscriber['frames']} frames, age at pickup avg {subscriber['avg_age_ms']:.1f}ms, "
+                      f"max {subscriber['max_age_ms']:.1f}ms")
+        
+        frame_age = self.golden_frame_age
+        if frame_age['clicks'] or frame_age['stale']:
+            average = frame_age['total_ms'] / frame_age['clicks'] if frame_age['clicks'] else 0.0
+            print(f"[{timestamp}] Golden frame age at click: avg {average:.1f}ms, max {frame_age['max_ms']:.1f}ms, "
+                  f"{frame_age['stale']} stale batches skipped")
+        
+        timing = self.golden_detection_timing
+        if timing['detections']:
+            print(f"[{timestamp}] Golden detection ({timing['backend']}): avg {timing['total_ms'] / timing['detections']:.2f}ms, "
+                  f"max {timing['max_ms']:.2f}ms over {timing['detections']} scans")
+    
+    def golden_cookie_watcher(self, stop_event, pipeline):
+        storm = StormTracker(self.config['golden_storm_detections'], self.config['golden_storm_window_sec'],
+                             self.config['golden_storm_idle_sec'])
+        detector = GoldenDetector(self.config, self.template_cache)
+        
+        worker = None
+        if self.config['detection_worker']:
+            try:
+                worker = DetectionWorker(self.config)
+                self.golden_detection_timing['backend'] = 'worker process'
+            except Exception as e:
+                print(f"[{datetime.now().strftime('%H:%M:%S')}] Could not start detection worker ({e}), detecting in-process")
+        
+        # each start_bot_threads() gives the watcher its own stop event and pipeline, so one left over from a
+        # restart can never pick up the next generation's frames
+        try:
+            while not stop_event.is_set():
+                if self.golden_running:
+                    try:
+                        if storm.active:
+                            interval = self.config['golden_storm_interval_ms'] / 1000
+                        else:
+                            total_interval = self.config['golden_check_interval_sec'] + (self.config['golden_check_interval_ms'] / 1000)
+                            interval = max(0.1, total_interval)
                         
-                        timestamp = datetime.now().strftime("%H:%M:%S")
-                        print(f"[{timestamp}] Found golden cookie at {location} (Session: {self.golden_cookies_clicked_session}, Total: {self.golden_cookies_clicked_total})")
+                        # the pipeline captures at the fastest subscriber's rate, this just waits for the next frame
+                        region = self.get_golden_scan_region()
+                        pipeline.subscribe('golden', region, interval)
+                        full_frame = pipeline.next_frame('golden', region, timeout=interval + 1)
+                        if full_frame is None:
+                            if pipeline.closed:
+                                break  # this pipeline's generation was stopped
+                            continue
                         
-                        big_cookie_was_running = self.big_running # store big cookie clicker status
+                        frame = full_frame.region(region)
+                        detect_start = time.perf_counter()
+                        if worker is not None:
+                            try:
+                                matches = worker.detect(frame, self.config['template_scale'], self.golden_scan_stats)
+                            except Exception as e:
+                                print(f"[{datetime.now().strftime('%H:%M:%S')}] Detection worker failed ({e}), detecting in-process")
+                                worker.close()
+                                worker = None
+                                self.golden_detection_timing['backend'] = 'in-process'
+                                matches = detector.detect(frame, self.golden_scan_stats)
+                        else:
+                            matches = detector.detect(frame, self.golden_scan_stats)
+                        detected_at = time.perf_counter()
+                        detect_ms = (detected_at - detect_start) * 1000
+                        self.golden_detection_timing['detections'] += 1
+                        self.golden_detection_timing['total_ms'] += detect_ms
+                        self.golden_detection_timing['max_ms'] = max(self.golden_detection_timing['max_ms'], detect_ms)
                         
-                        original_pos = pyautogui.position()
-                        pyautogui.click(location)
-
-                        if not big_cookie_was_running == True:
-                            pyautogui.moveTo(original_pos)
+                        locations = [Point(left + width // 2, top + height // 2) for _, left, top, width, height in matches]
+                        confidences = {Point(left + width // 2, top + height // 2): score for score, left, top, width, height in matches}
                         
-                        if big_cookie_was_running != self.big_running:
-                            print(f"[{timestamp}] Restoring big cookie clicker state to {big_cookie_was_running}")
-                            self.big_running = big_cookie_was_running
-                            self.update_status_display()
+                        # positions from a frame that's too old aren't worth clicking, the next frame will have the cookie if it's still there
+                        frame_age_ms = (time.perf_counter() - frame.captured_at) * 1000
+                        if locations and self.config['golden_max_frame_age_ms'] and frame_age_ms > self.config['golden_max_frame_age_ms']:
+                            print(f"[{datetime.now().strftime('%H:%M:%S')}] Dropping {len(locations)} golden cookie match(es) from a {frame_age_ms:.0f}ms old frame")
+                            self.golden_frame_age['stale'] += 1
+                            locations = []
+                            # the diff gate already took this frame as its previous one, it would skip the cookie from now on
+                            (worker or detector).reset()
                         
-                        self.save_config(show_confirmation=False)
+                        storm_event = storm.update(len(locations))
+                        if storm_event == 'started':
+                            print(f"[{datetime.now().strftime('%H:%M:%S')}] Cookie storm detected, scanning every {self.config['golden_storm_interval_ms']}ms")
+                        elif storm_event == 'ended':
+                            summary = storm.summary()
+                            print(f"[{datetime.now().strftime('%H:%M:%S')}] Cookie storm over: {summary['clicks']} golden cookies in {summary['duration_sec']:.1f}s "
+                                  f"({summary['clicks_per_sec']:.1f}/s, {summary['clicks_per_scan']:.2f} per scan over {summary['scans']} scans)")
                         
-                except Exception as e:
-                    print(f"[{datetime.now().strftime('%H:%M:%S')}] Error in golden cookie watcher: {e}")
-            
-            total_interval = self.config['golden_check_interval_sec'] + (self.config['golden_check_interval_ms'] / 1000)
-            time.sleep(max(0.1, total_interval))
+                        if locations:
+                            self.golden_cookies_clicked_session += len(locations)
+                            self.golden_cookies_clicked_total += len(locations)
+                            self.update_counter_display()
+                            
+                            timestamp = datetime.now().strftime("%H:%M:%S")
+                            found = ', '.join(str(tuple(location)) for location in locations)
+                            print(f"[{timestamp}] Found {len(locations)} golden cookie(s) at {found} (Session: {self.golden_cookies_clicked_session}, Total: {self.golden_cookies_clicked_total})")
+                            
+                            big_cookie_was_running = self.big_running # store big cookie clicker status
+                            
+                            # the big cookie clicker pauses while this holds the input and carries on at the big cookie afterwards
+                            resume_position = self.big_cookie_target if big_cookie_was_running else None
+                            with self.input.exclusive(resume_position):
+                                original_pos = self.input.position()
+                                if storm.active:
+                                    locations = order_click_path(original_pos, locations)
+                                
+                                frame_age_ms = (time.perf_counter() - frame.captured_at) * 1000
+                                self.golden_frame_age['clicks'] += 1
+                                self.golden_frame_age['last_ms'] = frame_age_ms
+                                self.golden_frame_age['total_ms'] += frame_age_ms
+                                self.golden_frame_age['max_ms'] = max(self.golden_frame_age['max_ms'], frame_age_ms)
+                                for location in locations:
+                                    self.input.click(location)
+                                    if self.history is not None:
+                                        latency_ms = (time.perf_counter() - detected_at) * 1000
+                                        self.history.record_golden(location, confidences.get(location), latency_ms)
+                                if self.history is not None:
+                                    self.history.record_clicks('golden', len(locations))
+                                
+                                # mid storm the next cookie is more important than putting the cursor back
+                                if not big_cookie_was_running == True and not storm.active:
+                                    self.input.move_to(original_pos)
+                            
+                            if big_cookie_was_running != self.big_running:
+                                print(f"[{timestamp}] Restoring big cookie clicker state to {big_cookie_was_running}")
+                                self.big_running = big_cookie_was_running
+                                self.update_status_display()
+                            
+                            self.persistence.mark_dirty('counters')
+                            
+                    except Exception as e:
+                        print(f"[{datetime.now().strftime('%H:%M:%S')}] Error in golden cookie watcher: {e}")
+                        time.sleep(0.1)
+                else:
+                    pipeline.unsubscribe('golden')
+                    stop_event.wait(0.1)
+        finally:
+            pipeline.unsubscribe('golden')
+            if worker is not None:
+                worker.close()
     
-    def big_cookie_clicker(self):
+    def big_cookie_clicker(self, stop_event):
         big_cookie_position = None
-        click_threads = []
-        should_click = False
-        click_count_lock = threading.Lock()
         start_time = 0  # To track when clicking started
+        reported_clicks = 0
         
-        # Create worker threads for clicking
-        def click_worker(worker_id):
-            local_count = 0
-            while not self.stop_event.is_set() and self.big_running and should_click:
-                try:
-                    pyautogui.click()
-                    local_count += 1
-                    
-                    if local_count >= 125:
-                        with click_count_lock:
-                            self.big_cookies_clicked_session += local_count
-                            self.big_cookies_clicked_total += local_count
-                        
-                        local_count = 0
-                        
-                        # limit ui updates
-                        if time.time() * 10 % 2 < 0.1:  # ~5% chance to update UI
-                            self.update_counter_display()
-                        
-                except Exception:
-                    pass
+        # the input backends don't sleep after each click like plain pyautogui calls do, so one thread is normally enough
+        pool = ClickWorkerPool(self.config['big_click_threads'])
+        self.click_pool = pool
+        scheduler = None
         
-        click_thread_count = 100 if self.config['big_check_interval_sec'] == 0 and self.config['big_check_interval_ms'] == 0 else 1
+        def click_worker(worker_id, stop, scheduler):
+            shard = self.big_click_counter.shard()
+            try:
+                while not stop.is_set() and not stop_event.is_set() and self.big_running:
+                    try:
+                        if not scheduler.wait(stop):
+                            break
+                        self.input.click()
+                        shard[0] += 1
+                    except Exception:
+                        pass
+            finally:
+                self.big_click_counter.release(shard)
         
         big_cookie_position = None
+        zoom_estimated = False  # only one multi-scale pass per search, not every retry
+        last_region_attempt = 0
+        next_search_time = 0
 
-
-
-        while not self.stop_event.is_set():
+        while not stop_event.is_set():
             if self.big_running:
                 try:
                     
-                    if big_cookie_position is None:
-                        # print("hi1")
+                    if big_cookie_position is None and time.time() >= next_search_time:
                         try:
-                            location = pyautogui.locateCenterOnScreen(self.config['big_image_path'], confidence=self.config['big_confidence'])
+                            frame = None
+                            location = self.revalidate_big_cookie_position()
+                            if location is None:
+                                frame = self.grab_frame('big')
+                                if frame is not None:
+                                    location = locate_best_center(self.big_cookie_templates(), frame, self.config['big_confidence'])
+                            
+                            if location is None and frame is not None and not zoom_estimated:
+                                zoom_estimated = True
+                                location = self.estimate_template_scale(frame)
                         except:
                             location = None
 
-                        # print("hi")
-
                         if location is not None:
                             big_cookie_position = location
+                            self.big_cookie_target = big_cookie_position
                             timestamp = datetime.now().strftime('%H:%M:%S')
                             print(f"[{timestamp}] Big cookie found at {big_cookie_position}")
+                            self.learn_golden_scan_region(big_cookie_position)
+                            self.remember_big_cookie_position(big_cookie_position)
 
-                            pyautogui.moveTo(big_cookie_position)
+                            self.input.move_to(big_cookie_position)
+                            self.mouse_watch.anchor(big_cookie_position)
                             print(f"[{timestamp}] Mouse positioned for continuous clicking")
                             
                             start_time = time.time()
-                            print(f"[{timestamp}] Starting {click_thread_count} click thread(s)")
+                            print(f"[{timestamp}] Starting {pool.size} click thread(s)")
 
                         else:
-                            pyautogui.move(0, -500)
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] Mouse moved up 100px to help big cookie detection")
+                            # hovered states are matched too, so just wait for the cookie to show up instead of moving the mouse
+                            next_search_time = time.time() + 1
+                            print(f"[{datetime.now().strftime('%H:%M:%S')}] Big cookie not found, retrying in 1s")
                     
                     if big_cookie_position:
-                        current_position = pyautogui.position()
-                        
-                        position_difference = (
-                            abs(current_position.x - big_cookie_position[0]),
-                            abs(current_position.y - big_cookie_position[1])
-                        )
-                        
-                        # stop clicking if mouse moved significantly
-                        if (time.time() - start_time > 0.5 and
-                            (position_difference[0] > 10 or position_difference[1] > 10)):
-                            timestamp = datetime.now().strftime('%H:%M:%S')
-                            print(f"[{timestamp}] Mouse moved by user, stopping big cookie clicker")
-                            self.toggle_big_bot()
-                            continue
+                        # the mouse listener stops the clicker itself, only poll the cursor if it couldn't start
+                        if not (self.mouse_listener and self.mouse_listener.is_alive()):
+                            current_position = self.input.position()
+                            
+                            position_difference = (
+                                abs(current_position.x - big_cookie_position[0]),
+                                abs(current_position.y - big_cookie_position[1])
+                            )
+                            
+                            # stop clicking if mouse moved significantly
+                            tolerance = self.config['big_move_tolerance']
+                            if (time.time() - start_time > 0.5 and
+                                (position_difference[0] > tolerance or position_difference[1] > tolerance)):
+                                timestamp = datetime.now().strftime('%H:%M:%S')
+                                print(f"[{timestamp}] Mouse moved by user, stopping big cookie clicker")
+                                self.toggle_big_bot()
+                                continue
                         
-                        # start threads if not already
-                        if not click_threads:
-                            should_click = True
-                            for i in range(click_thread_count):
-                                thread = threading.Thread(target=click_worker, args=(i,))
-                                thread.daemon = True
-                                thread.start()
-                                click_threads.append(thread)
+                        # start threads if not already, the pool won't while workers from the last run are still exiting
+                        if not pool.running and not stop_event.is_set():
+                            # one click per configured interval, 0 means as fast as the input backend goes
+                            interval = self.config['big_check_interval_sec'] + (self.config['big_check_interval_ms'] / 1000)
+                            run_scheduler = ClickScheduler(1 / interval if interval > 0 else 0, spin_ns=self.config['big_click_spin_us'] * 1000)
+                            if pool.start(lambda worker_id, stop: click_worker(worker_id, stop, run_scheduler)):
+                                scheduler = self.click_scheduler = run_scheduler
                         
-                        # Periodically save counters
-                        if (self.big_cookies_clicked_session // 500) > ((self.big_cookies_clicked_session - 10) // 500):
-                            self.save_config(show_confirmation=False)
+                        self.persistence.mark_dirty('counters')
+                        session_clicks = self.big_cookies_clicked_session
+                        if session_clicks // 500 != reported_clicks // 500:
+                            reported_clicks = session_clicks
                             timestamp = datetime.now().strftime('%H:%M:%S')
                             print(f"[{timestamp}] Big cookie clicks: Session: {self.big_cookies_clicked_session}, Total: {self.big_cookies_clicked_total}")
                                 
@@ -315,43 +2351,98 @@ class CookieClickerBot:
                     print(f"[{datetime.now().strftime('%H:%M:%S')}] Error in big cookie clicker: {e}")
             else:
                 # if not clicking stop all threads
-                if click_threads:
-                    with click_count_lock:
-                        should_click = False
-                        timestamp = datetime.now().strftime('%H:%M:%S')
-                        print(f"[{timestamp}] Stopping click threads")
-                        click_threads = []
-                        self.update_counter_display()
+                if scheduler is not None or pool.active_count():
+                    timestamp = datetime.now().strftime('%H:%M:%S')
+                    print(f"[{timestamp}] Stopping click threads")
+                    if not pool.stop(timeout=1.0):
+                        print(f"[{timestamp}] {pool.active_count()} click thread(s) still exiting")
+                    if scheduler is not None:
+                        scheduler.stop()
+                        rate = scheduler.stats()
+                        target = f"{rate['target_cps']:.0f}/s" if rate['target_cps'] else "unlimited"
+                        print(f"[{timestamp}] Big cookie click rate: {rate['achieved_cps']:.0f}/s (target {target}), "
+                              f"jitter {rate['jitter_ms']:.3f}ms over {rate['clicks']} clicks")
+                        scheduler = None
+                    self.update_counter_display()
                 
                 # reset position to force rescan on next start
                 big_cookie_position = None
+                self.big_cookie_target = None
+                self.mouse_watch.anchor(None)
+                zoom_estimated = False
+                next_search_time = 0
                 start_time = 0
+                
+                # golden scanning without a scan region covers the whole screen, find the big cookie here
+                # (not on the golden watcher thread, a full screen search takes about a second) to learn one
+                if self.golden_running and self.config['golden_scan_region_auto'] and self.config['golden_scan_region'] is None and \
+                   time.time() - last_region_attempt > 5:
+                    last_region_attempt = time.time()
+                    try:
+                        frame = self.grab_frame('big')
+                        big_location = locate_best_center(self.big_cookie_templates(), frame, self.config['big_confidence']) if frame is not None else None
+                    except Exception:
+                        big_location = None
+                    if big_location is not None:
+                        self.learn_golden_scan_region(big_location)
             
-            time.sleep(0.05)
+            self.record_big_click_history()
+            stop_event.wait(0.05)
+        
+        pool.stop(timeout=1.0)
     
     def start_bot_threads(self):
         if (self.golden_watcher_thread and self.golden_watcher_thread.is_alive()) or \
-           (self.big_clicker_thread and self.big_clicker_thread.is_alive()):
+           (self.big_clicker_thread and self.big_clicker_thread.is_alive()) or \
+           (self.capture_thread and self.capture_thread.is_alive()):
+            # the old threads keep their own (now set) stop event, anything still busy after the joins
+            # (a long search, a detection) exits as soon as it checks it instead of carrying on with the new generation
             self.stop_event.set()
+            if self.capture_thread:
+                self.capture_thread.join(timeout=1)
             if self.golden_watcher_thread:
                 self.golden_watcher_thread.join(timeout=1)
             if self.big_clicker_thread:
                 self.big_clicker_thread.join(timeout=1)
-            self.stop_event.clear()
+            self.stop_event = threading.Event()
+        
+        if self.input is not None:
+            self.input.close()
+        self.input = create_input_backend(self.config['input_backend'])
+        self.mouse_watch.tolerance = self.config['big_move_tolerance']
+        self.input.on_synthetic_move = self.mouse_watch.expect
         
-        self.golden_watcher_thread = threading.Thread(target=self.golden_cookie_watcher)
+        # one capture stage shared by every detector
+        capture = create_capture_backend(self.config['capture_backend'])
+        self.capture_backends = {'pipeline': capture}
+        self.capture_pipeline = CapturePipeline(capture, self.config['capture_slots'])
+        self.capture_thread = threading.Thread(target=self.capture_pipeline.run, args=(self.stop_event,), name="capture")
+        self.capture_thread.daemon = True
+        self.capture_thread.start()
+        
+        self.golden_watcher_thread = threading.Thread(target=self.golden_cookie_watcher, args=(self.stop_event, self.capture_pipeline),
+                                                      name="golden-watcher")
         self.golden_watcher_thread.daemon = True
         self.golden_watcher_thread.start()
         
-        self.big_clicker_thread = threading.Thread(target=self.big_cookie_clicker)
+        self.big_clicker_thread = threading.Thread(target=self.big_cookie_clicker, args=(self.stop_event,), name="big-clicker")
         self.big_clicker_thread.daemon = True
         self.big_clicker_thread.start()
         
         # Start keyboard listener if needed
-        if not self.keyboard_listener or not self.keyboard_listener.is_alive():
+        if keyboard is not None and (not self.keyboard_listener or not self.keyboard_listener.is_alive()):
             self.keyboard_listener = keyboard.Listener(on_press=self.on_key_press)
             self.keyboard_listener.start()
         
+        # mouse moves arrive as events instead of the big clicker polling the cursor
+        if mouse is not None and (not self.mouse_listener or not self.mouse_listener.is_alive()):
+            try:
+                self.mouse_listener = mouse.Listener(on_move=self.mouse_watch.on_move)
+                self.mouse_listener.start()
+            except Exception as e:
+                self.mouse_listener = None
+                print(f"[{datetime.now().strftime('%H:%M:%S')}] Mouse listener unavailable ({e}), polling the cursor instead")
+        
         print(f"[{datetime.now().strftime('%H:%M:%S')}] Press {self.config['golden_toggle_key'].upper()} to toggle Golden Cookie detection ON/OFF.")
         print(f"[{datetime.now().strftime('%H:%M:%S')}] Press {self.config['big_toggle_key'].upper()} to toggle Big Cookie clicking ON/OFF.")
     
@@ -369,7 +2460,7 @@ class CookieClickerBot:
         else:  # big
             self.big_cookies_clicked_total = 0
         self.update_counter_display()
-        self.save_config(show_confirmation=False)
+        self.persistence.mark_dirty('counters')
         print(f"[{datetime.now().strftime('%H:%M:%S')}] {cookie_type.capitalize()} cookie total counter reset to 0")
     
     def save_settings_from_gui(self, vars_dict, cookie_type):
@@ -495,7 +2586,7 @@ class CookieClickerBot:
         big_counter_frame = ttk.Frame(counter_frame)
         big_counter_frame.pack(fill=tk.X, pady=5)
         
-        ttk.Label(big_counter_frame, text="Big Cookies (inaccurate):").pack(side=tk.LEFT, padx=(0, 14))  # Added padding for alignment
+        ttk.Label(big_counter_frame, text="Big Cookies:").pack(side=tk.LEFT, padx=(0, 14))  # Added padding for alignment
         
         # Session counter
         ttk.Label(big_counter_frame, text="Session:").pack(side=tk.LEFT, padx=(10, 0))
@@ -517,16 +2608,33 @@ class CookieClickerBot:
         ttk.Button(big_counter_frame, text="Reset", command=lambda: self.reset_total_counter('big'), 
                 width=5).pack(side=tk.LEFT, padx=(5, 0))
         
+        # click workers only count, the labels are refreshed from here (on the tk thread) 10 times a second
+        def poll_counters():
+            self.update_counter_display()
+            root.after(100, poll_counters)
+        root.after(100, poll_counters)
+        
         # Start the bot threads
         self.start_bot_threads()
         
         # When window closes
         def on_closing():
             print(f"[{datetime.now().strftime('%H:%M:%S')}] Saving settings and shutting down...")
-            self.save_config(show_confirmation=False)
+            self.log_stats()
             self.stop_event.set()
+            if self.click_pool is not None:
+                self.click_pool.stop(timeout=1.0)  # so the compacted totals include every click
+            self.persistence.mark_dirty('settings', 'counters')
+            self.persistence.stop()
+            self.compact_stats_journal()
+            self.stats_journal.close()
+            if self.history is not None:
+                self.record_big_click_history()
+                self.history.close()
             if self.keyboard_listener:
                 self.keyboard_listener.stop()
+            if self.mouse_listener:
+                self.mouse_listener.stop()
             root.destroy()
         
         root.protocol("WM_DELETE_WINDOW", on_closing)
@@ -613,7 +2721,338 @@ class CookieClickerBot:
         root = self.create_gui()
         root.mainloop()
 
+DETECTOR_PRESETS = {
+    # detector configurations compared by the replay tool, applied on top of DEFAULT_CONFIG
+    'full': {'golden_match_mode': 'full', 'golden_grayscale': False, 'big_grayscale': False, 'golden_diff_gate': False,
+             'golden_color_prefilter': False},
+    'grayscale': {'golden_match_mode': 'full', 'golden_grayscale': True, 'golden_diff_gate': False, 'golden_color_prefilter': False},
+    'pyramid': {'golden_match_mode': 'pyramid', 'golden_diff_gate': False, 'golden_color_prefilter': False},
+    'default': {},
+}
+
+def parse_config_overrides(pairs):
+    # key=value strings from the command line, values parsed as python literals where possible
+    import ast
+    overrides = {}
+    for pair in pairs or []:
+        key, _, value = pair.partition('=')
+        if key not in DEFAULT_CONFIG:
+            raise ValueError(f"Unknown config key: {key}")
+        try:
+            overrides[key] = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            overrides[key] = value
+    return overrides
+
+def default_template_path(config_key, asset_name):
+    # installed copy if there is one, otherwise the one in the repo
+    path = DEFAULT_CONFIG[config_key]
+    return path if os.path.exists(path) else os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets', 'v1', asset_name)
+
+def load_replay_frames(directory):
+    # screenshots in name order plus labels.json: {"frame.png": {"golden": [[x, y], ...], "big": [[x, y]]}}
+    with open(os.path.join(directory, 'labels.json')) as f:
+        labels = json.load(f)
+    frames = []
+    for name in sorted(labels):
+        image = cv2.imread(os.path.join(directory, name), cv2.IMREAD_COLOR)
+        if image is None:
+            raise FileNotFoundError(f"Could not load recorded frame: {name}")
+        frames.append((name, image, labels[name]))
+    return frames
+
+def score_detections(found, expected, tolerance):
+    # greedy match of found positions to labelled ones, returns (true positives, false positives, false negatives)
+    remaining = [tuple(position) for position in expected]
+    true_positives = 0
+    for x, y in found:
+        nearest = min(remaining, key=lambda p: (p[0] - x) ** 2 + (p[1] - y) ** 2, default=None)
+        if nearest is not None and (nearest[0] - x) ** 2 + (nearest[1] - y) ** 2 <= tolerance ** 2:
+            remaining.remove(nearest)
+            true_positives += 1
+    return true_positives, len(found) - true_positives, len(remaining)
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    return float(np.percentile(values, pct))
+
+def summarize_detector_run(counts, latencies_ms):
+    true_positives, false_positives, false_negatives = counts
+    total_sec = sum(latencies_ms) / 1000
+    return {
+        'true_positives': true_positives,
+        'false_positives': false_positives,
+        'false_negatives': false_negatives,
+        'precision': true_positives / (true_positives + false_positives) if true_positives + false_positives else 1.0,
+        'recall': true_positives / (true_positives + false_negatives) if true_positives + false_negatives else 1.0,
+        'latency_p50_ms': percentile(latencies_ms, 50),
+        'latency_p90_ms': percentile(latencies_ms, 90),
+        'latency_p99_ms': percentile(latencies_ms, 99),
+        'latency_max_ms': max(latencies_ms, default=0.0),
+        'frames_per_sec': len(latencies_ms) / total_sec if total_sec else 0.0,
+    }
+
+def replay_detectors(frames, config, tolerance=20):
+    # runs golden and big cookie detection over recorded frames exactly like the bot would, without touching the screen
+    template_cache = TemplateCache()
+    golden_detector = GoldenDetector(config, template_cache)
+    big_templates = [template_cache.get(config['big_image_path'], grayscale=config['big_grayscale'], scale=config['template_scale'] * state_scale)
+                     for state_scale in config['big_state_scales']]
+    
+    golden_counts, big_counts = [0, 0, 0], [0, 0, 0]
+    golden_latencies, big_latencies = [], []
+    scan_stats = {}
+    for sequence, (_, image, labels) in enumerate(frames, start=1):
+        frame = Frame(image, sequence=sequence, full_screen=True)
+        
+        start = time.perf_counter()
+        matches = golden_detector.detect(frame, scan_stats)
+        golden_latencies.append((time.perf_counter() - start) * 1000)
+        found = [(left + width // 2, top + height // 2) for _, left, top, width, height in matches]
+        for i, value in enumerate(score_detections(found, labels.get('golden', []), tolerance)):
+            golden_counts[i] += value
+        
+        start = time.perf_counter()
+        location = locate_best_center(big_templates, frame, config['big_confidence'])
+        big_latencies.append((time.perf_counter() - start) * 1000)
+        for i, value in enumerate(score_detections([location] if location else [], labels.get('big', []), tolerance)):
+            big_counts[i] += value
+    
+    return {
+        'golden': dict(summarize_detector_run(golden_counts, golden_latencies), scan_stats=scan_stats),
+        'big': summarize_detector_run(big_counts, big_latencies),
+    }
+
+def run_replay(args):
+    frames = load_replay_frames(args.directory)
+    overrides = parse_config_overrides(args.set)
+    results = {}
+    for preset in args.presets:
+        if preset not in DETECTOR_PRESETS:
+            raise ValueError(f"Unknown detector preset: {preset} (choose from {', '.join(DETECTOR_PRESETS)})")
+        config = dict(DEFAULT_CONFIG, golden_image_path=args.golden_template, big_image_path=args.big_template)
+        config.update(DETECTOR_PRESETS[preset])
+        config.update(overrides)
+        results[preset] = replay_detectors(frames, config, args.tolerance)
+    
+    if args.json:
+        print(json.dumps({'frames': len(frames), 'results': results}, indent=2))
+        return 0
+    
+    print(f"Replayed {len(frames)} frames from {args.directory}")
+    for preset, result in results.items():
+        for target in ('golden', 'big'):
+            r = result[target]
+            print(f"{preset:>10} {target:>6}: precision {r['precision']:.3f}, recall {r['recall']:.3f}, "
+                  f"latency p50 {r['latency_p50_ms']:.1f}ms p90 {r['latency_p90_ms']:.1f}ms p99 {r['latency_p99_ms']:.1f}ms, "
+                  f"{r['frames_per_sec']:.1f} frames/s")
+    return 0
+
+BENCH_RESOLUTIONS = {'1080p': (1920, 1080), '1440p': (2560, 1440), '4k': (3840, 2160)}
+
+def synthesize_screenshot(size, golden, big, noise, distractors, rng, store_width=300):
+    # fake game screen: dark gradient, big cookie in the left column, one golden cookie anywhere the game spawns them
+    # (everywhere but the store), cookie coloured circles as distractors and gaussian noise on top so nothing matches perfectly
+    width, height = size
+    shade = np.linspace(30, 80, height, dtype=np.float32)[:, None, None]
+    frame = np.ascontiguousarray(np.broadcast_to(shade * np.array([1.4, 1.0, 0.7], dtype=np.float32), (height, width, 3)), dtype=np.uint8)
+    
+    big_height, big_width = big.shape[:2]
+    big_left, big_top = int(width * 0.15) - big_width // 2, int(height * 0.45) - big_height // 2
+    frame[big_top:big_top + big_height, big_left:big_left + big_width] = big
+    big_center = (big_left + big_width // 2, big_top + big_height // 2)
+    
+    golden_height, golden_width = golden.shape[:2]
+    radius = max(golden_width, golden_height) // 2
+    for _ in range(distractors):
+        center = (int(rng.integers(radius, width - radius)), int(rng.integers(radius, height - radius)))
+        color = (int(rng.integers(20, 90)), int(rng.integers(120, 200)), int(rng.integers(180, 255)))  # golden-ish BGR
+        cv2.circle(frame, center, int(rng.integers(radius // 2, radius)), color, -1)
+    
+    while True:
+        golden_left = int(rng.integers(0, width - store_width - golden_width))
+        golden_top = int(rng.integers(0, height - golden_height))
+        if golden_left >= big_left + big_width or golden_left + golden_width <= big_left or \
+           golden_top + golden_height <= big_top or golden_top >= big_top + big_height:
+            break  # not on top of the big cookie
+    frame[golden_top:golden_top + golden_height, golden_left:golden_left + golden_width] = golden
+    golden_center = (golden_left + golden_width // 2, golden_top + golden_height // 2)
+    
+    if noise:
+        frame = np.clip(frame.astype(np.int16) + rng.normal(0, noise, frame.shape).astype(np.int16), 0, 255).astype(np.uint8)
+    return frame, golden_center, big_center
+
+def bench_strategies(image, template, confidence, roi, pyramid_scale, template_cache, golden_path, template_scale):
+    # every matching strategy the bot offers, each returns the centre of the best golden cookie match or None
+    gray_template = template_cache.get(golden_path, grayscale=True, scale=template_scale)
+    small_template = template_cache.get(golden_path, grayscale=True, scale=template_scale * pyramid_scale)
+    
+    def best_center(frame, matches):
+        if not matches:
+            return None
+        _, left, top, width, height = matches[0]
+        return (frame.offset[0] + left + width // 2, frame.offset[1] + top + height // 2)
+    
+    def locate():
+        # what locateCenterOnScreen does once it has the screenshot
+        import pyscreeze
+        try:
+            box = pyscreeze.locate(template, image, confidence=confidence)
+        except pyscreeze.ImageNotFoundException:
+            box = None
+        return (box.left + box.width // 2, box.top + box.height // 2) if box else None
+    
+    def full():
+        frame = Frame(image)
+        return best_center(frame, find_all_matches(frame, template, confidence, 1))
+    
+    def grayscale():
+        frame = Frame(image)
+        return best_center(frame, find_all_matches(frame, gray_template, confidence, 1))
+    
+    def roi_full():
+        # grayscale (the default) inside the learned game region
+        frame = Frame(image, full_screen=True).region(roi)
+        return best_center(frame, find_all_matches(frame, gray_template, confidence, 1))
+    
+    def pyramid():
+        frame = Frame(image)
+        return best_center(frame, pyramid_find_matches(frame, template, small_template, confidence, pyramid_scale, 3))
+    
+    return {'locate': locate, 'full': full, 'grayscale': grayscale, 'roi': roi_full, 'pyramid': pyramid}
+
+def run_bench(args):
+    rng = np.random.default_rng(args.seed)
+    template_cache = TemplateCache()
+    pyramid_scale = 0.5 ** DEFAULT_CONFIG['golden_pyramid_levels']
+    confidence = DEFAULT_CONFIG['golden_confidence']
+    results = []
+    
+    for resolution in args.resolutions:
+        size = BENCH_RESOLUTIONS[resolution]
+        for scale in args.scales:
+            golden = template_cache.get(args.golden_template, scale=scale)
+            big = template_cache.get(args.big_template, scale=scale)
+            for noise in args.noise:
+                for distractors in args.distractors:
+                    store_width = int(DEFAULT_CONFIG['golden_scan_region_store_width'] * scale)
+                    image, golden_center, big_center = synthesize_screenshot(size, golden, big, noise, distractors, rng, store_width)
+                    # what the bot would learn from the big cookie, the golden cookie was placed without looking at it
+                    roi = estimate_game_region(big_center, size, store_width)
+                    strategies = bench_strategies(image, golden, confidence, roi, pyramid_scale, template_cache, args.golden_template, scale)
+                    
+                    for name in args.strategies:
+                        timings = []
+                        for _ in range(args.repeat):
+                            start = time.perf_counter()
+                            found = strategies[name]()
+                            timings.append((time.perf_counter() - start) * 1000)
+                        hit = found is not None and abs(found[0] - golden_center[0]) <= args.tolerance and \
+                            abs(found[1] - golden_center[1]) <= args.tolerance
+                        results.append({
+                            'resolution': resolution, 'scale': scale, 'noise': noise, 'distractors': distractors,
+                            'strategy': name, 'median_ms': float(np.median(timings)), 'min_ms': min(timings), 'found': bool(hit),
+                        })
+                        if not args.quiet:
+                            print(f"{resolution:>6} x{scale:<5} noise {noise:<3} distractors {distractors:<3} {name:>9}: "
+                                  f"{np.median(timings):8.1f}ms {'found' if hit else 'MISSED'}", file=sys.stderr)
+    
+    output = json.dumps({'confidence': confidence, 'repeat': args.repeat, 'results': results}, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+    return 0
+
+DURATION_UNITS = {'d': 86400, 'h': 3600, 'm': 60, 's': 1}
+MAX_DURATION = 100 * 365 * 86400  # well past any history, small enough for sqlite's integer timestamps
+
+def parse_duration(text):
+    # '90', '90s', '15m', '2h' or '7d' in seconds, doubles as an argparse type
+    text = text.strip().lower()
+    try:
+        if text and text[-1] in DURATION_UNITS:
+            seconds = float(text[:-1]) * DURATION_UNITS[text[-1]]
+        else:
+            seconds = float(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid duration {text!r}, expected e.g. 90, 90s, 15m, 2h or 7d")
+    if not math.isfinite(seconds) or seconds <= 0:
+        raise argparse.ArgumentTypeError(f"duration {text!r} has to be a positive number")
+    if seconds > MAX_DURATION:
+        raise argparse.ArgumentTypeError(f"duration {text!r} is longer than 100 years")
+    return seconds
+
+def format_duration(seconds):
+    # largest unit that divides it exactly, 3600 -> '1h'
+    for unit, size in DURATION_UNITS.items():
+        if seconds % size == 0:
+            return f"{seconds / size:.0f}{unit}"
+    return f"{seconds:g}s"
+
+def run_history(args):
+    end = time.time() - args.until if args.until else time.time()
+    results = {format_duration(window): HistoryStore.query(args.db, end - window, end) for window in args.windows}
+    
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+    
+    for window, r in results.items():
+        gap = f"{r['golden_gap_median_sec']:.1f}s" if r['golden_gap_median_sec'] is not None else "n/a"
+        latency = f"{r['golden_latency_avg_ms']:.1f}ms" if r['golden_latency_avg_ms'] is not None else "n/a"
+        print(f"last {window:>5}: {r['big_clicks']} big clicks ({r['big_per_sec']:.1f}/s, {r['big_per_active_sec']:.1f}/s while clicking), "
+              f"{r['golden_clicks']} golden ({r['golden_per_hour']:.1f}/h, median gap {gap}, click latency avg {latency})")
+    return 0
+
+def run_cli(argv):
+    parser = argparse.ArgumentParser(prog='main.py', description="Cookie Clicker Cookie Clicker tools. Run without arguments for the GUI.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    replay = commands.add_parser('replay', help="measure detector accuracy and speed on recorded screenshots")
+    replay.add_argument('directory', help="folder of screenshots with a labels.json")
+    replay.add_argument('--presets', nargs='+', default=list(DETECTOR_PRESETS), help="detector configurations to compare")
+    replay.add_argument('--set', action='append', metavar='KEY=VALUE', help="override a config value for every preset")
+    replay.add_argument('--tolerance', type=int, default=20, help="max distance in pixels for a detection to count as correct")
+    replay.add_argument('--golden-template', default=default_template_path('golden_image_path', 'golden_cookie.png'))
+    replay.add_argument('--big-template', default=default_template_path('big_image_path', 'big_cookie.png'))
+    replay.add_argument('--json', action='store_true', help="print results as JSON")
+    replay.set_defaults(handler=run_replay)
+    
+    bench = commands.add_parser('bench', help="time every matching strategy on synthetic screenshots")
+    bench.add_argument('--resolutions', nargs='+', default=list(BENCH_RESOLUTIONS), choices=list(BENCH_RESOLUTIONS))
+    bench.add_argument('--scales', nargs='+', type=float, default=[1.0, 1.25])
+    bench.add_argument('--noise', nargs='+', type=float, default=[0, 8], help="gaussian noise standard deviations")
+    bench.add_argument('--distractors', nargs='+', type=int, default=[0, 20], help="golden coloured circles per screenshot")
+    bench.add_argument('--strategies', nargs='+', default=['locate', 'full', 'grayscale', 'roi', 'pyramid'],
+                       choices=['locate', 'full', 'grayscale', 'roi', 'pyramid'])
+    bench.add_argument('--repeat', type=int, default=3)
+    bench.add_argument('--tolerance', type=int, default=10)
+    bench.add_argument('--seed', type=int, default=0)
+    bench.add_argument('--golden-template', default=default_template_path('golden_image_path', 'golden_cookie.png'))
+    bench.add_argument('--big-template', default=default_template_path('big_image_path', 'big_cookie.png'))
+    bench.add_argument('--output', help="write the JSON results here instead of stdout")
+    bench.add_argument('--quiet', action='store_true', help="no progress lines on stderr")
+    bench.set_defaults(handler=run_bench)
+    
+    history = commands.add_parser('history', help="click and golden cookie rates from the recorded history")
+    history.add_argument('windows', nargs='*', type=parse_duration, default=[3600, 86400, 604800], help="windows to report, e.g. 15m 1h 7d")
+    history.add_argument('--until', type=parse_duration, help="end the windows this long ago instead of now, e.g. 1d")
+    history.add_argument('--db', default=HISTORY_FILE)
+    history.add_argument('--json', action='store_true', help="print results as JSON")
+    history.set_defaults(handler=run_history)
+    
+    args = parser.parse_args(argv)
+    if args.command == 'history' and not os.path.exists(args.db):
+        history.error(f"no click history at {args.db}, run the bot with history_enabled first")
+    return args.handler(args)
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(run_cli(sys.argv[1:]))
+    
     # create directory if it doesn't exist
     if not os.path.exists(root_dir):
         os.makedirs(root_dir)
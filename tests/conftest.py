@@ -0,0 +1,67 @@
+import os
+import sys
+import threading
+
+import numpy as np
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import main  # noqa: E402
+
+
+class FakeCapture(main.CaptureBackend):
+    # serves a fixed screen image, no display needed
+    name = 'fake'
+    
+    def __init__(self, screen=None):
+        super().__init__()
+        self.screen = np.full((600, 800, 3), 40, dtype=np.uint8) if screen is None else screen
+        self.screen_size = (self.screen.shape[1], self.screen.shape[0])
+        self.closed = threading.Event()
+    
+    def _grab(self, region, out):
+        left, top, width, height = region if region else (0, 0) + self.screen_size
+        if out is None:
+            self.allocation_count += 1
+            out = np.empty((height, width, 3), dtype=np.uint8)
+        out[...] = self.screen[top:top + height, left:left + width]
+        return out
+    
+    def close(self):
+        self.closed.set()
+
+
+@pytest.fixture
+def bot_factory(tmp_path, monkeypatch):
+    # CookieClickerBot with its files in tmp_path, a fake screen and the recording input backend
+    monkeypatch.setattr(main, 'CONFIG_FILE', str(tmp_path / 'cccc-data.pkl'))
+    monkeypatch.setattr(main, 'STATS_JOURNAL_FILE', str(tmp_path / 'cccc-stats.journal'))
+    monkeypatch.setattr(main, 'HISTORY_FILE', str(tmp_path / 'cccc-history.sqlite'))
+    monkeypatch.setattr(main, 'create_capture_backend', lambda preference='auto': FakeCapture())
+    monkeypatch.setattr(main, 'keyboard', None)
+    monkeypatch.setattr(main, 'mouse', None)
+    bots = []
+
+    def make(**config):
+        bot = main.CookieClickerBot()
+        bot.config.update({
+            'input_backend': 'null',
+            'golden_image_path': os.path.join(REPO_ROOT, 'assets', 'v1', 'golden_cookie.png'),
+            'big_image_path': os.path.join(REPO_ROOT, 'assets', 'v1', 'big_cookie.png'),
+            'golden_scan_region_auto': False,
+        })
+        bot.config.update(config)
+        bots.append(bot)
+        return bot
+
+    yield make
+    for bot in bots:
+        bot.stop_event.set()
+        for thread in (bot.golden_watcher_thread, bot.big_clicker_thread, bot.capture_thread):
+            if thread is not None:
+                thread.join(timeout=5)
+        bot.persistence.stop()
+        if bot.history is not None:
+            bot.history.close()
@@ -0,0 +1,119 @@
+import gc
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+import main
+from conftest import REPO_ROOT, FakeCapture
+
+GOLDEN_PATH = os.path.join(REPO_ROOT, 'assets', 'v1', 'golden_cookie.png')
+
+
+def run_pipeline(capture, slots=1):
+    pipeline = main.CapturePipeline(capture, slots)
+    stop = threading.Event()
+    thread = threading.Thread(target=pipeline.run, args=(stop,), daemon=True)
+    thread.start()
+    return pipeline, stop, thread
+
+
+def test_pipeline_recycles_frame_buffers():
+    capture = FakeCapture()
+    pipeline, stop, thread = run_pipeline(capture, slots=2)
+    pipeline.subscribe('golden', (100, 50, 300, 200), 0)
+    try:
+        for _ in range(50):
+            frame = pipeline.next_frame('golden', (100, 50, 300, 200), timeout=2)
+            assert frame is not None and frame.shape == (200, 300, 3)
+            assert frame.shared_name is not None
+            del frame
+    finally:
+        stop.set()
+        thread.join(timeout=5)
+
+    stats = pipeline.stats()['buffers']
+    assert stats['allocations'] <= 2 + 3
+    assert stats['misses'] == 0
+    assert capture.allocation_count == 0  # every grab went into a pooled buffer
+
+
+def test_held_frames_are_never_overwritten():
+    capture = FakeCapture()
+    pipeline, stop, thread = run_pipeline(capture)
+    pipeline.subscribe('golden', None, 0)
+    try:
+        held = pipeline.next_frame('golden', timeout=2)
+        capture.screen = np.full_like(capture.screen, 200)
+        for _ in range(20):
+            assert pipeline.next_frame('golden', timeout=2) is not None
+        assert (held.image == 40).all()
+    finally:
+        stop.set()
+        thread.join(timeout=5)
+    del held
+    gc.collect()
+    assert pipeline.stats()['buffers']['buffers'] == 0  # closed pool let go of everything once the frames were gone
+
+
+def test_detection_worker_reads_pipeline_frames_without_copying():
+    screen = np.full((600, 800, 3), 40, dtype=np.uint8)
+    golden = cv2.imread(GOLDEN_PATH)
+    screen[300:300 + golden.shape[0], 420:420 + golden.shape[1]] = golden
+    pipeline, stop, thread = run_pipeline(FakeCapture(screen))
+    config = dict(main.DEFAULT_CONFIG, golden_image_path=GOLDEN_PATH, golden_diff_gate=False, golden_color_prefilter=False)
+    worker = main.DetectionWorker(config)
+    region = (200, 200, 500, 300)
+    pipeline.subscribe('golden', region, 0)
+    try:
+        frame = pipeline.next_frame('golden', region, timeout=2).region(region)
+        matches = worker.detect(frame, 1.0, {})
+        assert worker.copies == 0
+        assert matches == main.GoldenDetector(config).detect(frame)
+        assert [(left, top) for _, left, top, _, _ in matches] == [(420, 300)]
+
+        # frames that aren't in shared memory still work, through a copy
+        assert worker.detect(main.Frame(screen[200:500, 200:700], (200, 200)), 1.0, {}) == matches
+        assert worker.copies == 1
+    finally:
+        worker.close()
+        stop.set()
+        thread.join(timeout=5)
+
+
+def test_new_subscribers_never_get_frames_from_before_they_subscribed():
+    capture = FakeCapture()
+    pipeline, stop, thread = run_pipeline(capture)
+    try:
+        pipeline.subscribe('golden', None, 0)
+        old = pipeline.next_frame('golden', timeout=2)
+        pipeline.unsubscribe('golden')  # F8 off, the old frame stays in the slot buffer
+        time.sleep(0.2)
+
+        pipeline.subscribe('golden', None, 0.5)  # F8 on again
+        subscribed_at = time.perf_counter()
+        frame = pipeline.next_frame('golden', timeout=2)
+        assert frame.sequence > old.sequence
+        assert frame.captured_at >= subscribed_at - 0.01
+
+        pipeline.subscribe('big', None, 0)
+        assert pipeline.next_frame('big', timeout=2).sequence > frame.sequence
+    finally:
+        stop.set()
+        thread.join(timeout=5)
+
+
+def test_stale_matches_reset_the_diff_gate():
+    screen = np.full((600, 800, 3), 40, dtype=np.uint8)
+    golden = cv2.imread(GOLDEN_PATH)
+    screen[300:300 + golden.shape[0], 420:420 + golden.shape[1]] = golden
+    config = dict(main.DEFAULT_CONFIG, golden_image_path=GOLDEN_PATH, golden_color_prefilter=False)
+    detector = main.GoldenDetector(config)
+    frame = main.Frame(screen)
+
+    assert detector.detect(frame)
+    assert detector.detect(frame) == []  # unchanged, the gate skips it
+    detector.reset()  # what the watcher does when it throws the first matches away as stale
+    assert detector.detect(frame)
@@ -0,0 +1,32 @@
+import pytest
+
+import main
+
+
+@pytest.mark.parametrize('arguments', [['1x'], ['--until', 'soon'], ['--', '-5m'], ['nan'], ['inf'], ['1e400'],
+                                       ['1h', '--until', '1e20'], ['--until', 'nan']])
+def test_history_rejects_bad_durations(arguments, tmp_path, capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        main.run_cli(['history', '--db', str(tmp_path / 'history.sqlite')] + arguments)
+    assert exit_info.value.code == 2
+    assert 'duration' in capsys.readouterr().err
+
+
+def test_history_without_a_database_is_a_usage_error(tmp_path, capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        main.run_cli(['history', '--db', str(tmp_path / 'missing.sqlite')])
+    assert exit_info.value.code == 2
+    assert 'no click history' in capsys.readouterr().err
+
+
+def test_history_reports_each_window(tmp_path, capsys):
+    path = str(tmp_path / 'history.sqlite')
+    store = main.HistoryStore(path)
+    store.start()
+    store.record_clicks('big', 50)
+    store.close()
+
+    assert main.run_cli(['history', '90', '15m', '--db', path]) == 0
+    lines = capsys.readouterr().out.splitlines()
+    assert [line.split(':')[0] for line in lines] == ['last   90s', 'last   15m']
+    assert all('50 big clicks' in line for line in lines)
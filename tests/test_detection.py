@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+import main
+
+
+@pytest.mark.parametrize('size', list(main.BENCH_RESOLUTIONS.values()))
+def test_learned_region_covers_everywhere_golden_cookies_spawn(size):
+    width, height = size
+    store_width = 300
+    cookie = (int(width * 0.15), int(height * 0.45))  # middle of the left 30% column of a maximised game
+    assert main.estimate_game_region(cookie, size, store_width) == (0, 0, width - store_width, height)
+
+
+def test_learned_region_follows_a_window_that_doesnt_fill_the_screen():
+    # game window from x=1000 to the right edge of a 4K screen, its left column is 0.3 * 2840 wide
+    left, top, width, height = main.estimate_game_region((1000 + 426, 900), (3840, 2160), 300)
+    assert abs(left - 1000) <= 1
+    assert (top, left + width, height) == (0, 3840 - 300, 2160)
+
+
+def test_bench_places_golden_cookies_across_the_whole_game():
+    # the bench places golden cookies over the whole game area, not inside whatever the estimator says
+    rng = np.random.default_rng(0)
+    golden = np.zeros((74, 80, 3), dtype=np.uint8)
+    big = np.zeros((216, 210, 3), dtype=np.uint8)
+    centers = [main.synthesize_screenshot((3840, 2160), golden, big, 0, 0, rng)[1] for _ in range(40)]
+    assert max(x for x, _ in centers) > 3840 * 0.6
+    assert max(y for _, y in centers) > 2160 * 0.8 and min(y for _, y in centers) < 2160 * 0.2
@@ -0,0 +1,111 @@
+import multiprocessing
+import threading
+import time
+
+import main
+
+
+def alive_threads(name):
+    return [thread for thread in threading.enumerate() if thread.name == name and thread.is_alive()]
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return condition()
+
+
+def test_restarts_do_not_leak_threads_or_worker_processes(bot_factory):
+    bot = bot_factory(detection_worker=True, golden_check_interval_ms=500)
+    bot.golden_running = True
+    for _ in range(3):
+        bot.start_bot_threads()  # what Save Settings does
+        time.sleep(0.3)
+
+    assert wait_for(lambda: len(alive_threads('golden-watcher')) == 1)
+    assert len(alive_threads('big-clicker')) == 1
+    assert len(alive_threads('capture')) == 1
+    assert wait_for(lambda: len(multiprocessing.active_children()) == 1)
+
+    bot.stop_event.set()
+    assert wait_for(lambda: not alive_threads('golden-watcher') and not alive_threads('capture'))
+    assert wait_for(lambda: not multiprocessing.active_children())
+
+
+def test_closed_pipeline_wakes_waiting_consumers():
+    pipeline = main.CapturePipeline(None)
+    pipeline.subscribe('golden', None, 0.1)
+    result = {}
+
+    def consumer():
+        start = time.perf_counter()
+        result['frame'] = pipeline.next_frame('golden', timeout=30)
+        result['waited'] = time.perf_counter() - start
+
+    thread = threading.Thread(target=consumer)
+    thread.start()
+    time.sleep(0.1)
+    pipeline.close()
+    thread.join(timeout=5)
+
+    assert not thread.is_alive()
+    assert result['frame'] is None
+    assert result['waited'] < 5
+
+
+def test_click_worker_pool_stops_every_worker():
+    pool = main.ClickWorkerPool(size=4)
+    counter = main.ShardedCounter()
+
+    def work(worker_id, stop):
+        shard = counter.shard()
+        try:
+            while not stop.is_set():
+                shard[0] += 1
+        finally:
+            counter.release(shard)
+
+    for _ in range(5):  # quick F9 toggling
+        assert pool.start(work)
+        time.sleep(0.01)
+        assert pool.stop(timeout=2)
+        assert pool.active_count() == 0
+
+    clicks = counter.value()
+    time.sleep(0.05)
+    assert counter.value() == clicks  # nothing still counting after stop
+    assert pool.stats()['started'] == 20
+    assert pool.stats()['lingering'] == 0
+
+
+def test_exclusive_input_pauses_other_clickers():
+    backend = main.RecordingInput(start=(10, 10))
+    stop = threading.Event()
+
+    def clicker():
+        while not stop.is_set():
+            backend.click()
+            time.sleep(0.001)
+
+    thread = threading.Thread(target=clicker)
+    thread.start()
+    try:
+        time.sleep(0.02)
+        with backend.exclusive(resume_position=(10, 10)):
+            backend.click((500, 400))
+            before = backend.click_count
+            time.sleep(0.02)
+            assert backend.click_count == before  # nobody else clicked while we held the input
+        time.sleep(0.02)
+    finally:
+        stop.set()
+        thread.join(timeout=5)
+
+    events = list(backend.events)
+    golden = next(i for i, event in enumerate(events) if event[:3] == ('click', 500, 400))
+    assert events[golden + 1][:3] == ('move', 10, 10)
+    assert all(event[1:3] == (10, 10) for event in events[golden + 1:])
+    assert backend.stats()['preemptions'] == 1
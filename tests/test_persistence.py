@@ -0,0 +1,72 @@
+import os
+import threading
+import time
+
+import main
+
+
+def test_journal_recovers_from_a_torn_last_record(tmp_path):
+    path = str(tmp_path / 'stats.journal')
+    journal = main.StatsJournal(path)
+    journal.record('golden', 3)
+    journal.record('big', 1000)
+    journal.record('big', 1500)
+    journal.close()
+
+    with open(path, 'ab') as f:
+        f.write(main.StatsJournal.RECORD.pack(0.0, 1, 2000)[:7])  # crash half way through the next record
+
+    reopened = main.StatsJournal(path)
+    assert reopened.load() == {'golden': 3, 'big': 1500}
+
+
+def test_journal_skips_unchanged_totals_and_compacts(tmp_path):
+    path = str(tmp_path / 'stats.journal')
+    journal = main.StatsJournal(path)
+    for total in (1, 1, 2, 2, 3):
+        journal.record('big', total)
+    assert journal.records == 3
+
+    journal.compact({'golden': 7, 'big': 3})
+    assert os.path.getsize(path) == 2 * main.StatsJournal.RECORD.size
+    journal.record('big', 4)
+    journal.close()
+    assert main.StatsJournal(path).load() == {'golden': 7, 'big': 4}
+
+
+def test_flusher_debounces_and_flushes_on_stop():
+    writes = []
+    lock = threading.Lock()
+
+    def writer():
+        with lock:
+            writes.append(time.monotonic())
+
+    flusher = main.PersistenceFlusher({'settings': writer}, debounce=0.3)
+    flusher.start()
+    for _ in range(200):
+        flusher.mark_dirty('settings')
+        time.sleep(0.002)
+    # ~0.4s of constant marking, the first one written straight away and at most one more per 0.3s
+    assert 1 <= len(writes) <= 3
+    assert all(later - earlier >= 0.3 for earlier, later in zip(writes, writes[1:]))
+
+    flusher.mark_dirty('settings')
+    written = len(writes)
+    flusher.stop()
+    assert len(writes) == written + 1  # the last change made it to disk even though it wasn't due yet
+    assert not flusher._thread.is_alive()
+
+
+def test_bot_shutdown_keeps_the_last_clicks(bot_factory):
+    bot = bot_factory()
+    bot.persistence.start()
+    bot.persistence.mark_dirty('counters')
+    time.sleep(0.1)  # first write goes straight out, the next one would wait for the debounce
+    bot.persistence.debounce = 60
+    bot.big_click_counter.add(123)
+    bot.persistence.mark_dirty('counters')
+    bot.persistence.stop()
+
+    totals = main.StatsJournal(main.STATS_JOURNAL_FILE).load()
+    assert totals['big'] == bot.big_cookies_clicked_total